@@ -1,9 +1,13 @@
 import logging
 import pandas as pd
+import hashlib
 import json
 import os
+import re
+import threading
 import time
 import requests
+from collections import OrderedDict
 from typing import Dict, Any, Optional
 import numpy as np
 from dotenv import load_dotenv
@@ -17,6 +21,42 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Cheap local gate in front of the LLM relevance check: instructions that are plainly
+# conversational (asking for a poem, a joke, a story, the weather or a stock quote) are
+# declined without a Gemini round trip. Only the opening of the request is matched, so data
+# requests that merely mention such topics ("Show weather patterns by month") still go to the
+# LLM, which sees the columns. Anything that looks like a data-analysis request is never declined.
+_RELEVANT_RE = re.compile(
+    r'\b(report|analy[sz]e|analysis|summary|summari[sz]e|trend|insight|correlation|outlier|churn|kpi|dashboard'
+    r'|statistic|distribution)s?\b', re.IGNORECASE)
+_OFF_TOPIC_RE = re.compile(
+    r'^\s*(?:please\s+)?(?:write|tell)(?: me)? (?:an? )?(?:short |funny )?(?:poem|joke)s?\b'
+    r'|^\s*tell me (?:a )?story\b'
+    r'|^\s*what(?:\'s| is) the weather\b'
+    r'|^\s*what(?:\'s| is) the (?:current )?stock price of\b', re.IGNORECASE)
+
+
+def _is_off_topic_instruction(instructions: str) -> bool:
+    """
+    Returns True if the instructions are clearly unrelated to data report generation.
+    """
+    return bool(_OFF_TOPIC_RE.search(instructions)) and not _RELEVANT_RE.search(instructions)
+
+
+# Key observations from successful profiling calls, keyed by a hash of the dataset profile and
+# the instructions, so re-running the same upload with the same instructions skips the LLM.
+_OBSERVATIONS_CACHE_MAX_ENTRIES = 128
+_observations_cache: "OrderedDict[str, str]" = OrderedDict()
+# Streamlit runs each session in its own thread, so lookups and evictions must not interleave
+_observations_cache_lock = threading.Lock()
+
+
+def clear_observations_cache() -> None:
+    """Drops all cached profiling results."""
+    with _observations_cache_lock:
+        _observations_cache.clear()
+
+
 # Define the Pydantic model for the expected LLM output for data profiling
 class DataFrameProfileOutput(BaseModel):
     num_rows: int = Field(description="Number of rows in the dataset.")
@@ -27,6 +67,39 @@ class DataFrameProfileOutput(BaseModel):
         description="Key observations about the dataset's structure, quality, and potential issues (e.g., missing values, outliers, data types that need conversion).")
 
 
+# Built once at import; only the profile and instructions vary per call
+_PROFILE_PARSER = JsonOutputParser(pydantic_object=DataFrameProfileOutput)
+_PROFILE_PROMPT = PromptTemplate(
+    template="""
+                You are an AI assistant specialized in quickly analyzing data profiles.
+                
+                You must evaluate the user's instructions.
+        
+                If the user's instructions are unrelated to analyzing or reporting on the provided dataset,
+                politely decline with this exact message:
+                "I am a report generator AI and do not have information on that topic. Please give instructions related to data report generation."
+                Do NOT provide any other information or explanation if you are declining.
+                
+                Otherwise, proceed with the following task:
+                Given the following dataset profile, summarize key observations, potential data quality issues,
+                and suggest initial steps for cleaning or preparing the data.
+                Focus on identifying missing values, outliers, incorrect data types, or any inconsistencies.
+                
+        
+                Dataset Profile:
+                {profile_data}
+        
+                User Request/Instructions: {instructions}
+        
+                {format_instructions}
+        
+                Ensure your response is valid JSON.
+                """,
+    input_variables=["profile_data", "instructions"],
+    partial_variables={"format_instructions": _PROFILE_PARSER.get_format_instructions()},
+)
+
+
 def data_analysis_node(state: GraphState) -> GraphState:
     """
     Performs initial data profiling and analysis based on the uploaded CSV.
@@ -44,6 +117,12 @@ def data_analysis_node(state: GraphState) -> GraphState:
         state['error_message'] = "Cannot perform data analysis: A file path was not provided."
         return state
 
+    if _is_off_topic_instruction(instructions or ""):
+        logger.warning(f"User instructions unrelated to data analysis for request {request_id}")
+        state['status'] = "error"
+        state['error_message'] = "User instructions were not related to data report generation."
+        return state
+
     logger.info(f"DataAnalysisNode processing request: {request_id}")
 
     gemini_api_key = os.getenv("GEMINI_API_KEY")
@@ -125,6 +204,22 @@ def data_analysis_node(state: GraphState) -> GraphState:
 
         profile_data["column_details"][col] = detail
 
+    # profile_data_str is now guaranteed to be JSON serializable.
+    # Compact separators: indentation only adds prompt tokens, the model doesn't need it
+    profile_data_str = json.dumps(profile_data, separators=(",", ":"))
+    cache_key = hashlib.sha256(f"{profile_data_str}\n{instructions}".encode("utf-8")).hexdigest()
+    with _observations_cache_lock:
+        cached_observations = _observations_cache.get(cache_key)
+        if cached_observations is not None:
+            _observations_cache.move_to_end(cache_key)
+    if cached_observations is not None:
+        logger.info(f"Reusing cached data profiling result for request {request_id}.")
+        profile_data["key_observations"] = cached_observations
+        state['dataframe_profile'] = DataProfile(**profile_data)
+        state['dataframe'] = df
+        state['status'] = "data_profiled"
+        return state
+
     # --- LLM Interaction with Retry Logic ---
     max_retries = 3
     base_delay = 2  # seconds
@@ -133,42 +228,7 @@ def data_analysis_node(state: GraphState) -> GraphState:
         try:
             logger.info(f"Attempt {attempt + 1}/{max_retries} to invoke LLM for data profiling...")
 
-            parser = JsonOutputParser(pydantic_object=DataFrameProfileOutput)
-            prompt = PromptTemplate(
-                template="""
-                You are an AI assistant specialized in quickly analyzing data profiles.
-                
-                You must evaluate the user's instructions.
-        
-                If the user's instructions are unrelated to analyzing or reporting on the provided dataset,
-                politely decline with this exact message:
-                "I am a report generator AI and do not have information on that topic. Please give instructions related to data report generation."
-                Do NOT provide any other information or explanation if you are declining.
-                
-                Otherwise, proceed with the following task:
-                Given the following dataset profile, summarize key observations, potential data quality issues,
-                and suggest initial steps for cleaning or preparing the data.
-                Focus on identifying missing values, outliers, incorrect data types, or any inconsistencies.
-                
-        
-                Dataset Profile:
-                {profile_data}
-        
-                User Request/Instructions: {instructions}
-        
-                {format_instructions}
-        
-                Ensure your response is valid JSON.
-                """,
-                input_variables=["profile_data", "instructions"],
-                partial_variables={"format_instructions": parser.get_format_instructions()},
-            )
-
-            # try:
-                # profile_data_str is now guaranteed to be JSON serializable
-            profile_data_str = json.dumps(profile_data, indent=2)
-
-            llm_response = llm.invoke(prompt.invoke({
+            llm_response = llm.invoke(_PROFILE_PROMPT.invoke({
                 "profile_data": profile_data_str,
                 "instructions": instructions
             }),config={"request_options": {"timeout": 60}})
@@ -199,8 +259,14 @@ def data_analysis_node(state: GraphState) -> GraphState:
 
             # Update profile_data with LLM's key_observations
             profile_data["key_observations"] = parsed_profile_output.key_observations
+            with _observations_cache_lock:
+                _observations_cache[cache_key] = parsed_profile_output.key_observations
+                if len(_observations_cache) > _OBSERVATIONS_CACHE_MAX_ENTRIES:
+                    _observations_cache.popitem(last=False)
             # Update the state with the DataProfile Pydantic model
             state['dataframe_profile'] = DataProfile(**profile_data)
+            # Hand the parsed frame to later nodes so they don't parse the CSV again
+            state['dataframe'] = df
             state['status'] = "data_profiled"
             logger.info(f"DataAnalysisNode completed for request: {request_id}")
             return state
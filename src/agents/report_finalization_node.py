@@ -2,14 +2,26 @@ import logging
 import os
 import re
 from datetime import datetime
+from os.path import exists as _exists, abspath as _abspath
 import traceback
 import markdown
-from weasyprint import HTML
 from graph.state import GraphState
 from schemas.messages import ReportFormat
 
 logger = logging.getLogger(__name__)
 
+# Matches the [FIGURE N] placeholders the drafting node leaves in the narratives
+_FIG_RE = re.compile(r'\[FIGURE (\d+)\]')
+
+def _get_html():
+    """
+    Imports weasyprint's HTML on first use. weasyprint loads the cairo/pango native libraries,
+    so importing this module (and building the graph) doesn't pay for it until a PDF is written.
+    """
+    from weasyprint import HTML
+    return HTML
+
+
 # LOCAL_APP_DATA_DIR = "local_app_data"
 # REPORT_OUTPUT_DIR = os.path.join(LOCAL_APP_DATA_DIR, "reports")
 # CHART_OUTPUT_DIR = os.path.join(LOCAL_APP_DATA_DIR, "charts")
@@ -65,7 +77,7 @@ def report_finalization_node(state: GraphState) -> GraphState:
             current_narrative_text = narrative_original_md
             embedded_visuals_markdown_for_this_narrative = []
             figure_id_map = report_sections_draft.figure_id_map or {}
-            figure_placeholders_in_narrative = re.findall(r'\[FIGURE (\d+)\]', narrative_original_md)
+            figure_placeholders_in_narrative = _FIG_RE.findall(narrative_original_md)
             unique_figure_numbers = sorted(list(set(figure_placeholders_in_narrative)), key=int)
 
             for fig_num_str in unique_figure_numbers:
@@ -74,12 +86,12 @@ def report_finalization_node(state: GraphState) -> GraphState:
                     visual_id_from_map = figure_id_map[generic_figure_placeholder]
                     visual_obj = visuals_by_id.get(visual_id_from_map)
 
-                    if visual_obj and os.path.exists(visual_obj.file_path):
+                    if visual_obj and _exists(visual_obj.file_path):
                         current_narrative_text = current_narrative_text.replace(
                             generic_figure_placeholder,
                             f"Figure {fig_num_str}"
                         )
-                        abs_chart_path_url = f"file:///{os.path.abspath(visual_obj.file_path).replace(os.sep, '/')}"
+                        abs_chart_path_url = f"file:///{_abspath(visual_obj.file_path).replace(os.sep, '/')}"
                         embedded_visuals_markdown_for_this_narrative.append(
                             f"\n![{visual_obj.description}]({abs_chart_path_url})\n")
                         embedded_visuals_markdown_for_this_narrative.append(
@@ -168,7 +180,7 @@ def report_finalization_node(state: GraphState) -> GraphState:
             """
 
             report_pdf_file_path = os.path.join(report_output_dir, f"{report_filename_base}.pdf")
-            HTML(string=html_content, base_url=report_output_dir).write_pdf(report_pdf_file_path)
+            _get_html()(string=html_content, base_url=report_output_dir).write_pdf(report_pdf_file_path)
             pdf_file_path = report_pdf_file_path
             logger.info(f"Final PDF report saved to: {pdf_file_path}")
 
@@ -1,6 +1,10 @@
 import logging
+import hashlib
 import os
+import re
+import threading
 import time
+from collections import OrderedDict
 from typing import Optional
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
@@ -27,6 +31,87 @@ class SafetyCheckResult(BaseModel):
     reasoning: str = Field(description="Explanation for the decision, especially if the check fails.")
 
 
+# Built once at import. The static instructions and JSON schema come first and the
+# per-report inputs last, so every request shares the same prompt prefix.
+# The parser only supplies the format instructions; responses are validated with SafetyCheckResult.
+_SAFETY_PARSER = JsonOutputParser(pydantic_object=SafetyCheckResult)
+
+_SAFETY_PROMPT_TEMPLATE = """
+You are an expert report reviewer. Your task is to validate a drafted report for both safety and accuracy.
+
+{format_instructions}
+
+Do not add any text outside of the JSON object.
+
+Please review the following:
+
+1.  **Report Draft**:
+    {report_draft}
+2.  **Original Instructions**:
+    {instructions}
+3.  **Dataset Profile**:
+    {dataframe_profile}
+"""
+
+_SAFETY_PROMPT = PromptTemplate.from_template(_SAFETY_PROMPT_TEMPLATE).partial(
+    format_instructions=_SAFETY_PARSER.get_format_instructions())
+
+
+# Passing verdicts (both safe and accurate), keyed by a hash of the full prompt, so re-checking
+# an unchanged draft against the same data and instructions skips the LLM. Failing verdicts
+# are never cached: a flaky failure must be re-evaluated when the user tries again.
+_SAFETY_CACHE_MAX_ENTRIES = 128
+_safety_cache: "OrderedDict[str, SafetyCheckResult]" = OrderedDict()
+# Streamlit runs each session in its own thread, so lookups and evictions must not interleave
+_safety_cache_lock = threading.Lock()
+
+
+def clear_safety_cache() -> None:
+    """Drops all cached safety check results."""
+    with _safety_cache_lock:
+        _safety_cache.clear()
+
+
+# The body of a ``` or ```json fenced block anywhere in the response
+_JSON_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+
+
+def _extract_json(text: str) -> str:
+    """
+    Pulls the JSON object out of an LLM response, tolerating a code fence (with or without
+    a language tag) and any text around it. Anything that isn't an object is returned as-is
+    for the validator to reject.
+    """
+    match = _JSON_FENCE_RE.search(text)
+    json_str = match.group(1) if match else text.strip()
+    start, end = json_str.find("{"), json_str.rfind("}")
+    if start != -1 and end > start:
+        json_str = json_str[start:end + 1]
+    return json_str
+
+
+def _apply_verdict(state: GraphState, validated_result: SafetyCheckResult) -> GraphState:
+    """Records the outcome of a safety check verdict in the state."""
+    # Check for safety and accuracy
+    if not validated_result.is_safe:
+        error_msg = f"Safety check failed: {validated_result.reasoning}"
+        logger.error(error_msg)
+        state['status'] = "error"
+        state['error_message'] = error_msg
+        return state
+
+    if not validated_result.is_accurate:
+        error_msg = f"Accuracy check failed: {validated_result.reasoning}"
+        logger.error(error_msg)
+        state['status'] = "error"
+        state['error_message'] = error_msg
+        return state
+
+    logger.info("Comprehensive safety and accuracy check passed.")
+    state['status'] = "safety_checked"
+    return state
+
+
 def safety_check_node(state: GraphState) -> GraphState:
     """
     Performs a comprehensive safety and accuracy check on the generated report draft.
@@ -42,6 +127,29 @@ def safety_check_node(state: GraphState) -> GraphState:
         logger.warning("Missing required state information for safety check. Skipping.")
         return state
 
+    # The prompt doesn't change between attempts, so build it once
+    try:
+        prompt = _SAFETY_PROMPT.format(
+            report_draft=report_draft.model_dump_json(indent=2),
+            instructions=instructions,
+            dataframe_profile=dataframe_profile.model_dump_json(indent=2),
+        )
+    except Exception as e:
+        logger.error(f"Non-retryable error: failed to build the safety check prompt: {e}")
+        state['status'] = "error"
+        state['error_message'] = f"Report validation failed due to an internal error: {e}"
+        return state
+
+    # An identical prompt (same draft, instructions and profile) gets the same verdict, so reuse it
+    cache_key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    with _safety_cache_lock:
+        cached_result = _safety_cache.get(cache_key)
+        if cached_result is not None:
+            _safety_cache.move_to_end(cache_key)
+    if cached_result is not None:
+        logger.info("Reusing cached safety check result.")
+        return _apply_verdict(state, cached_result)
+
     # Implement retry logic with exponential backoff for resilience
     max_retries = 3
     base_delay = 2  # seconds
@@ -68,56 +176,20 @@ def safety_check_node(state: GraphState) -> GraphState:
         try:
             logger.info(f"Attempt {attempt + 1}/{max_retries} to invoke LLM for safety check...")
 
-            # Set up the Pydantic parser
-            parser = JsonOutputParser(pydantic_object=SafetyCheckResult)
-
-            prompt_template = """
-            You are an expert report reviewer. Your task is to validate a drafted report for both safety and accuracy.
-
-            Please review the following:
-
-            1.  **Report Draft**:
-                {report_draft}
-            2.  **Original Instructions**:
-                {instructions}
-            3.  **Dataset Profile**:
-                {dataframe_profile}
-
-            {format_instructions}
-
-            Do not add any text outside of the JSON object.
-            """
-
-            prompt = PromptTemplate.from_template(prompt_template).format(
-                report_draft=report_draft.model_dump_json(indent=2),
-                instructions=instructions,
-                dataframe_profile=dataframe_profile.model_dump_json(indent=2),
-                format_instructions=parser.get_format_instructions()
-            )
-
             llm_response = llm.invoke(prompt, config={"request_options": {"timeout": 60}})
 
-            # Use the parser to get a validated dictionary from the LLM response
-            validated_result = parser.invoke(llm_response)
+            json_str = _extract_json(llm_response.content)
 
-            # Check for safety and accuracy
-            if not validated_result['is_safe']:
-                error_msg = f"Safety check failed: {validated_result['reasoning']}"
-                logger.error(error_msg)
-                state['status'] = "error"
-                state['error_message'] = error_msg
-                return state
+            # Parse and validate in one pass, straight into the model. Unlike JsonOutputParser,
+            # this rejects truncated JSON instead of repairing it into a verdict.
+            validated_result = SafetyCheckResult.model_validate_json(json_str)
 
-            if not validated_result['is_accurate']:
-                error_msg = f"Accuracy check failed: {validated_result['reasoning']}"
-                logger.error(error_msg)
-                state['status'] = "error"
-                state['error_message'] = error_msg
-                return state
-
-            logger.info("Comprehensive safety and accuracy check passed.")
-            state['status'] = "safety_checked"
-            return state
+            if validated_result.is_safe and validated_result.is_accurate:
+                with _safety_cache_lock:
+                    _safety_cache[cache_key] = validated_result
+                    if len(_safety_cache) > _SAFETY_CACHE_MAX_ENTRIES:
+                        _safety_cache.popitem(last=False)
+            return _apply_verdict(state, validated_result)
 
         # Handle specific exceptions for retries
         except (requests.exceptions.RequestException, TimeoutError) as e:
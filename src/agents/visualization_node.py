@@ -4,9 +4,8 @@ import json
 import os
 import requests
 import time
+from functools import lru_cache
 from typing import List, Dict, Any, Optional
-import matplotlib.pyplot as plt
-import seaborn as sns
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import PromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -21,6 +20,20 @@ os.makedirs(CHART_OUTPUT_DIR, exist_ok=True)
 
 
 
+@lru_cache(maxsize=None)
+def _get_plotting():
+    """
+    Imports pyplot and seaborn on first use, so importing this module (and building the graph)
+    doesn't pay for them. Selects the non-interactive Agg backend first: charts are only ever
+    written to files, never shown.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    return plt, sns
+
+
 class SuggestedVisualizations(BaseModel):
     suggestions: List[VisualGenerationInstruction] = Field(
         description="A list of suggested visualizations, including chart type, columns, title, and description.")
@@ -31,25 +44,25 @@ def generate_chart(df: pd.DataFrame, instruction: VisualGenerationInstruction, o
     Generates a chart based on the instruction and saves it to the output path.
     Returns the file_path if successful, None otherwise.
     """
-    fig, ax = plt.subplots(figsize=(10, 6))
-    chart_code_str = ""
+    # Validate the instruction before creating a figure, so invalid ones never load the plotting libraries
+    if not instruction.columns or not all(col in df.columns for col in instruction.columns):
+        missing_cols = [col for col in instruction.columns if col not in df.columns]
+        logger.warning(
+            f"Skipping chart generation: Missing or invalid columns {missing_cols} for instruction: {instruction.model_dump_json()}")
+        return None
 
-    try:
-        if not instruction.columns or not all(col in df.columns for col in instruction.columns):
-            missing_cols = [col for col in instruction.columns if col not in df.columns]
+    for col in instruction.columns:
+        if instruction.type in ["histogram", "boxplot", "line", "scatter"] and not pd.api.types.is_numeric_dtype(
+                df[col]):
             logger.warning(
-                f"Skipping chart generation: Missing or invalid columns {missing_cols} for instruction: {instruction.model_dump_json()}")
-            plt.close(fig)
+                f"Skipping chart {instruction.type}: Column '{col}' is not numeric for numeric plot type. Instruction: {instruction.model_dump_json()}")
             return None
 
-        for col in instruction.columns:
-            if instruction.type in ["histogram", "boxplot", "line", "scatter"] and not pd.api.types.is_numeric_dtype(
-                    df[col]):
-                logger.warning(
-                    f"Skipping chart {instruction.type}: Column '{col}' is not numeric for numeric plot type. Instruction: {instruction.model_dump_json()}")
-                plt.close(fig)
-                return None
+    plt, sns = _get_plotting()
+    fig, ax = plt.subplots(figsize=(10, 6))
+    chart_code_str = ""
 
+    try:
         if instruction.type == "bar":
             if len(instruction.columns) == 2:
                 x_col, y_col = instruction.columns[0], instruction.columns[1]
@@ -176,9 +189,11 @@ def visualization_node(state: GraphState) -> GraphState:
         state['error_message'] = f"Failed to initialize LLM for visualization: {e}"
         return state
 
-    # Load data
+    # Load data, reusing the frame already parsed by the data analysis node when available
     try:
-        df = pd.read_csv(file_path)
+        df = state.get('dataframe')
+        if df is None:
+            df = pd.read_csv(file_path)
         if df.empty:
             raise ValueError("Uploaded CSV is empty.")
     except Exception as e:
@@ -236,7 +251,7 @@ def visualization_node(state: GraphState) -> GraphState:
             logger.info(f"DEBUG: Calling LLM for visualization suggestions.")
 
             column_details_json = json.dumps(dataframe_profile.model_dump(exclude_unset=True),
-                                             indent=2)  # Use model_dump
+                                             separators=(",", ":"))  # Compact to keep the prompt short
             llm_response = llm.invoke(prompt.invoke({
                 "column_details_json": column_details_json,
                 "instructions": instructions
@@ -1,4 +1,4 @@
-from typing import List, Optional, TypedDict
+from typing import Any, List, Optional, TypedDict
 from schemas.messages import DataProfile, AnalysisInsight, GeneratedVisual, ReportSectionsDraft, ReportFormat, UserFeedback
 
 class GraphState(TypedDict):
@@ -8,6 +8,7 @@ class GraphState(TypedDict):
     Attributes:
         request_id (str): A unique identifier for the current report generation request.
         file_path (str): The path to the uploaded CSV file.
+        dataframe (Optional[Any]): The pandas DataFrame parsed from file_path by the data analysis node, reused by later nodes instead of re-reading the CSV.
         instructions (str): User's original instructions for the report.
         dataframe_profile (Optional[DataProfile]): Profile of the uploaded dataframe after initial analysis.
         analysis_insights (Optional[List[AnalysisInsight]]): List of key insights derived from the data.
@@ -17,9 +18,12 @@ class GraphState(TypedDict):
         feedback_history (Optional[List[UserFeedback]]): History of user feedback for iterative refinement.
         status (str): Current status of the report generation process (e.g., "pending", "data_profiled", "visuals_generated", "insights_generated", "draft_ready", "clarification_needed", "completed", "error").
         error_message (Optional[str]): Any error message if the process fails.
+        chart_output_dir (Optional[str]): Directory for chart images; the report finalization node defaults to local_app_data/charts.
+        report_output_dir (Optional[str]): Directory for the finalized report files; defaults to local_app_data/reports.
     """
     request_id: str
     file_path: str
+    dataframe: Optional[Any]
     instructions: str
     dataframe_profile: Optional[DataProfile]
     analysis_insights: Optional[List[AnalysisInsight]]
@@ -30,3 +34,5 @@ class GraphState(TypedDict):
     status: str
     error_message: Optional[str]
     safety_check_retries: int
+    chart_output_dir: Optional[str]
+    report_output_dir: Optional[str]
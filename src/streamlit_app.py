@@ -1,14 +1,12 @@
 import re
-import base64
+import hashlib
 import streamlit as st
 import os
+import shutil
 import uuid
 import logging
-from datetime import datetime
 from graph.state import GraphState
-from graph.builder import create_graph_workflow
 from schemas.messages import GeneratedVisual, AnalysisInsight, ReportSectionsDraft, ReportFormat
-import streamlit.components.v1 as components
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -25,37 +23,142 @@ os.makedirs(CHART_OUTPUT_DIR, exist_ok=True)
 os.makedirs(REPORT_OUTPUT_DIR, exist_ok=True)
 # load_dotenv()
 
+# Define the order of steps for the progress bar
+STEPS = [
+    "data_analysis",
+    "visualization",
+    "insight_generation",
+    "report_drafting",
+    "safety_check",
+    "report_finalization"
+]
+
+# Map node names to user-friendly messages for a more specific UI
+STEP_MESSAGES = {
+    "data_analysis": "🔍 Analyzing data and creating a profile...",
+    "visualization": "📊 Generating visualizations...",
+    "insight_generation": "💡 Generating key insights from the data...",
+    "report_drafting": "✍️ Drafting the report content...",
+    "safety_check": "🛡️ Performing a safety and accuracy check...",
+    "report_finalization": "✅ Finalizing the report and generating output files..."
+}
+
+_SANITIZE_RE = re.compile(r'[^\w\.-]')
+
 def sanitize_filename(filename: str) -> str:
     """
     Sanitizes a filename to prevent directory traversal and other security issues.
     Replaces non-alphanumeric characters with underscores.
     """
-    sanitized_name = re.sub(r'[^\w\.-]', '_', filename)
-    sanitized_name = sanitized_name.strip(' .')
-    sanitized_name = sanitized_name.replace('..', '_')
-    return sanitized_name
+    return _SANITIZE_RE.sub('_', filename).strip(' .').replace('..', '_')
+
+def compute_upload_digest(uploaded_file) -> str:
+    """
+    Returns the SHA-256 hex digest of an uploaded file, leaving it rewound for the caller.
+    Uses hashlib.file_digest where available (Python 3.11+) so the hashing runs in C over the buffer.
+    """
+    uploaded_file.seek(0)
+    if hasattr(hashlib, "file_digest"):
+        digest = hashlib.file_digest(uploaded_file, "sha256").hexdigest()
+    else:
+        hasher = hashlib.sha256()
+        for chunk in iter(lambda: uploaded_file.read(1024 * 1024), b""):
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+    uploaded_file.seek(0)
+    return digest
+
+def release_file_cache(file_path: str) -> None:
+    """
+    Advises the kernel that the cached pages of a file will not be read again.
+    Uploaded CSVs are only read by the workflow run that follows the upload, so
+    keeping them in the page cache just evicts pages other sessions still need.
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(file_path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        logger.warning(f"Could not release page cache for {file_path}: {e}")
+
+@st.cache_resource
+def get_workflow_app():
+    """
+    Builds the compiled LangGraph workflow once per process.
+    The compiled graph holds no per-request state, so it is shared across reruns and sessions.
+    """
+    # Imported here so the first page render doesn't wait on langgraph and
+    # pandas being loaded by the agent modules
+    from graph.builder import create_graph_workflow
+    return create_graph_workflow()
+
+@st.cache_data(max_entries=8)
+def _load_pdf(path: str, mtime: float) -> bytes:
+    """
+    Reads the finalized PDF once per file version instead of on every rerun.
+    The mtime argument is only part of the cache key, so a regenerated file is read again.
+    Only the most recent few PDFs are kept, so reports from every session don't pile up in memory.
+    """
+    with open(path, "rb") as file:
+        return file.read()
 
-def display_pdf(pdf_bytes):
+def render_report(final_state) -> None:
     """
-    Encodes PDF bytes to base64 and displays them in a Streamlit app using an iframe.
-    This method is more robust for cloud deployments.
+    Renders the outcome of a workflow run: the error/instruction messages or the PDF download.
+    Used both right after a run and on later reruns, from the result kept in session_state.
     """
-    if pdf_bytes:
-        base64_pdf = base64.b64encode(pdf_bytes).decode("utf-8")
-        pdf_display_html = f"""
-        <div style="width: 100%; height: 600px; border: 1px solid #ccc; border-radius: 8px; overflow: hidden;">
-            <iframe 
-                src="data:application/pdf;base64,{base64_pdf}" 
-                width="100%" 
-                height="100%" 
-                style="border: none;">
-            </iframe>
-        </div>
-        """
-        # Using components.html is often more reliable than st.markdown for custom HTML
-        components.html(pdf_display_html, height=620)
+    # Check the final state for errors
+    if final_state.get("status") == "error":
+        st.info("You can try running the process again.")
+        st.error(f"❌ An error occurred: {final_state.get('error_message')}")
+
+        # Don't proceed to display report content
+    elif final_state.get('status') == 'invalid_instructions':
+        st.warning("⚠️ The AI could not process your instructions.")
+        st.info("💡 Please give instructions related to data reporting.")
     else:
-        st.error("No PDF content to display.")
+        st.success("🎉 Report Generation Complete!")
+        st.success("Data Profile, Visualizations, Insights, Report Drafted, and Finalized!")
+        st.subheader("📄 Final Report Downloads")
+
+        # Report display logic
+        if final_state and final_state['final_report']:
+            if final_state['final_report'].pdf_file_path and os.path.exists(final_state['final_report'].pdf_file_path):
+                pdf_file_content = None
+                try:
+                    pdf_path = final_state['final_report'].pdf_file_path
+                    pdf_file_content = _load_pdf(pdf_path, os.path.getmtime(pdf_path))
+                except Exception as e:
+                    st.info("You can try running the process again.")
+                    st.error(f"Error reading PDF file for download/preview: {e}")
+                    pdf_file_content = None
+
+                if pdf_file_content:
+                    st.download_button(
+                        label="Download Final Report (PDF)",
+                        data=pdf_file_content,
+                        file_name=os.path.basename(final_state['final_report'].pdf_file_path),
+                        mime="application/pdf",
+                        key="download_pdf_button"
+                    )
+                else:
+                    st.warning("PDF report content not available for download or preview.")
+                    if "Error generating PDF" in (final_state.get('error_message') or ""):
+                        st.info("You can try running the process again.")
+                        st.error("PDF generation failed. Check terminal logs for details.")
+
+            else:
+                st.warning("PDF report file not found or could not be generated.")
+                if "Error generating PDF" in (final_state.get('error_message') or ""):
+                    st.info("You can try running the process again.")
+                    st.error("PDF generation failed. Check terminal logs for details.")
+
+        else:
+            st.warning("Final report content not available.")
 
 
 st.set_page_config(page_title="AI Report Generator", layout="wide")
@@ -75,193 +178,122 @@ user_instructions = st.text_area(
 )
 # Sanitize user instructions
 user_instructions = user_instructions.strip()
-# user_instructions = st.text_area(
-#     "Enter your instructions for the report", height=100)
 if not user_instructions:
     user_instructions = "data analysis report"
 
 if uploaded_file:
-    if st.button("Generate Report"):
-        # Use a more advanced progress display
-        status_message = st.empty()
-        progress_bar = st.progress(0)
-        # progress_text = st.empty()
-
-        # Define the order of steps for the progress bar
-        steps = [
-            "data_analysis",
-            "visualization",
-            "insight_generation",
-            "report_drafting",
-            "safety_check",
-            "report_finalization"
-        ]
-
-        # Map node names to user-friendly messages for a more specific UI
-        step_messages = {
-            "data_analysis": "🔍 Analyzing data and creating a profile...",
-            "visualization": "📊 Generating visualizations...",
-            "insight_generation": "💡 Generating key insights from the data...",
-            "report_drafting": "✍️ Drafting the report content...",
-            "safety_check": "🛡️ Performing a safety and accuracy check...",
-            "report_finalization": "✅ Finalizing the report and generating output files..."
-        }
-
-        request_id = str(uuid.uuid4())
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        # Sanitize the filename to prevent security vulnerabilities
-        sanitized_filename = sanitize_filename(uploaded_file.name)
-        unique_filename = f"{timestamp}_{sanitized_filename}"
-        file_save_path = os.path.join(UPLOAD_DIR, unique_filename)
-
-        try:
-            with open(file_save_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            logger.info(f"File saved to: {file_save_path}")
-        except Exception as e:
-            st.info("You can try running the process again.")
-            st.error(f"Error saving file: {e}")
-            logger.error(f"File saving error: {e}", exc_info=True)
+    # A finished run is identified by the upload's content and the instructions it ran with.
+    # Hashing a large upload takes a while, so it is done once per uploaded file, not on every rerun
+    if st.session_state.get("upload_digest_file_id") != uploaded_file.file_id:
+        st.session_state["upload_digest"] = compute_upload_digest(uploaded_file)
+        st.session_state["upload_digest_file_id"] = uploaded_file.file_id
+    upload_digest = st.session_state["upload_digest"]
+    result_key = (upload_digest, user_instructions)
+    if st.button("Generate Report", disabled=st.session_state.get("in_flight", False)):
+        # Guard against a second click re-running the whole workflow while one is still in progress
+        if st.session_state.get("in_flight"):
+            st.warning("Report generation already in progress.")
             st.stop()
+        st.session_state["in_flight"] = True
+        try:
+            # Use a more advanced progress display
+            status_message = st.empty()
+            progress_bar = st.progress(0)
 
-        initial_state: GraphState = {
-            "request_id": request_id,
-            "file_path": file_save_path,
-            "instructions": user_instructions,
-            "dataframe_profile": None,
-            "analysis_insights": None,
-            "generated_visuals": None,
-            "report_sections_draft": None,
-            "final_report": None,
-            "status": "initial",
-            "error_message": None,
-            "safety_check_retries": 0,
-        }
+            request_id = str(uuid.uuid4())
+            # Sanitize the filename to prevent security vulnerabilities
+            sanitized_filename = sanitize_filename(uploaded_file.name)
 
-        try:
-            workflow_app = create_graph_workflow()
-            final_state = None
-
-            with st.spinner(
-                    "Processing data, generating profile, visuals, insights, drafting and finalizing report..."):
-
-                # Display initial message
-                status_message.info("Graph workflow started...")
-                # progress_text.info("Graph workflow started...")
-
-                # Stream the graph execution to show progress
-                for i, state in enumerate(workflow_app.stream(initial_state)):
-                    for node, current_state in state.items():
-                        if node != "__end__":
-                            if current_state.get('status') == 'retrying':
-                                retries = current_state.get('safety_check_retries', 0)
-                                st.warning(f"⚠️ Safety check failed. Retrying report drafting (Attempt {retries} of 2)...")
-                            else:
-                                # Otherwise, show the normal progress messages
-                                progress_value = (steps.index(node) + 1) / len(steps)
-                                progress_bar.progress(progress_value)
-                                status_message.info(step_messages.get(node, f'Processing {node}...'))
-                            
-                            # Update the progress bar and status message
-                            # progress_value = (i + 1) / len(steps)
-                            # progress_bar.progress(progress_value)
-                            # status_message.info(step_messages.get(node, f'Processing {node}...'))
-                            final_state = current_state
-
-                # After the loop, hide the progress bar
-                progress_bar.empty()
-                status_message.empty()
-
-                # Map node names to user-friendly messages
-                step_messages = {
-                    "data_analysis": "🔍 Analyzing data and creating a profile...",
-                    "visualization": "📊 Generating visualizations...",
-                    "insight_generation": "💡 Generating key insights from the data...",
-                    "report_drafting": "✍️ Drafting the report content...",
-                    "safety_check": "🛡️ Performing a safety and accuracy check...",
-                    "report_finalization": "✅ Finalizing the report and generating output files..."
-                }
-
-                # # Stream the graph execution to show progress
-                # for state in workflow_app.stream(initial_state):
-                #     for node, current_state in state.items():
-                #         if node != "__end__":
-                #             progress_text.info(f"{step_messages.get(node, f'Processing {node}...')}")
-                #             final_state = current_state
-
-                # After the loop, check the final state for errors
-                if final_state.get("status") == "error":
-                    st.info("You can try running the process again.")
-                    st.error(f"❌ An error occurred: {final_state.get('error_message')}")
-                    
-                    # Don't proceed to display report content
-                elif final_state.get('status') == 'invalid_instructions':
-                    st.warning("⚠️ The AI could not process your instructions.")
-                    st.info("💡 Please give instructions related to data reporting.")
+            try:
+                # Name uploads by content so re-running the same CSV reuses the file already on disk
+                unique_filename = f"{upload_digest[:16]}_{sanitized_filename}"
+                file_save_path = os.path.join(UPLOAD_DIR, unique_filename)
+                if os.path.exists(file_save_path):
+                    logger.info(f"Reusing previously saved upload: {file_save_path}")
                 else:
-                    st.success("🎉 Report Generation Complete!")
-                    st.success("Data Profile, Visualizations, Insights, Report Drafted, and Finalized!")
-                    st.subheader("📄 Final Report Downloads")
-
-                    # Report display logic
-                    if final_state and final_state['final_report']:
-                        if final_state['final_report'].pdf_file_path and os.path.exists(final_state['final_report'].pdf_file_path):
-                            pdf_file_content = None
-                            try:
-                                with open(final_state['final_report'].pdf_file_path, "rb") as file:
-                                    pdf_file_content = file.read()
-                                # st.write(f"PDF content loaded? {pdf_file_content is not None}")
-                            except Exception as e:
-                                st.info("You can try running the process again.")
-                                st.error(f"Error reading PDF file for download/preview: {e}")
-                                pdf_file_content = None
-
-                            if pdf_file_content:
-                                st.download_button(
-                                    label="Download Final Report (PDF)",
-                                    data=pdf_file_content,
-                                    file_name=os.path.basename(final_state['final_report'].pdf_file_path),
-                                    mime="application/pdf",
-                                    key="download_pdf_button"
-                                )
-                                
-                                # with st.container():
-                                #     st.markdown(
-                                #         """
-                                #         <style>
-                                #         .stContainer > div {
-                                #             width: 55%;
-                                #             margin: auto;
-                                #         }
-                                #         </style>
-                                #         """,
-                                #         unsafe_allow_html=True
-                                #     )
-
-                                # display_pdf(pdf_file_content)
-
-                                # base64_pdf = base64.b64encode(pdf_file_content).decode("utf-8")
-                                # pdf_display = f'<iframe src="data:application/pdf;base64,{base64_pdf}" width="100%" height="600" type="application/pdf"></iframe>'
-                                # st.markdown(pdf_display, unsafe_allow_html=True)
-                            
-                                
-                            else:
-                                st.warning("PDF report content not available for download or preview.")
-                                if "Error generating PDF" in (final_state.get('error_message') or ""):
-                                    st.info("You can try running the process again.")
-                                    st.error("PDF generation failed. Check terminal logs for details.")
-                                    
-                        else:
-                            st.warning("PDF report file not found or could not be generated.")
-                            if "Error generating PDF" in (final_state.get('error_message') or ""):
-                                st.info("You can try running the process again.")
-                                st.error("PDF generation failed. Check terminal logs for details.")
-                                
-                    else:
-                        st.warning("Final report content not available.")
-
-        except Exception as e:
-            st.info("You can try running the process again.")
-            st.error(f"❌ An unexpected critical error occurred during graph execution: {e}")
-            logger.error(f"An unexpected critical error occurred during graph execution:: {e}", exc_info=True)
-            st.stop()
+                    # Write to a per-request temp file and rename, so a concurrent run never reads a partial file
+                    temp_path = f"{file_save_path}.{request_id}.part"
+                    try:
+                        with open(temp_path, "wb") as f:
+                            # The digest is cached across reruns, so don't rely on it having rewound the buffer
+                            uploaded_file.seek(0)
+                            shutil.copyfileobj(uploaded_file, f, length=1024 * 1024)
+                        os.replace(temp_path, file_save_path)
+                    except Exception:
+                        # Don't leave a partial upload behind in the uploads directory
+                        if os.path.exists(temp_path):
+                            os.remove(temp_path)
+                        raise
+                    logger.info(f"File saved to: {file_save_path}")
+            except Exception as e:
+                st.info("You can try running the process again.")
+                st.error(f"Error saving file: {e}")
+                logger.error(f"File saving error: {e}", exc_info=True)
+                st.stop()
+
+            initial_state: GraphState = {
+                "request_id": request_id,
+                "file_path": file_save_path,
+                "dataframe": None,
+                "instructions": user_instructions,
+                "dataframe_profile": None,
+                "analysis_insights": None,
+                "generated_visuals": None,
+                "report_sections_draft": None,
+                "final_report": None,
+                "status": "initial",
+                "error_message": None,
+                "safety_check_retries": 0,
+            }
+
+            try:
+                workflow_app = get_workflow_app()
+                final_state = None
+
+                with st.spinner(
+                        "Processing data, generating profile, visuals, insights, drafting and finalizing report..."):
+
+                    # Display initial message
+                    status_message.info("Graph workflow started...")
+
+                    # Stream the graph execution to show progress.
+                    # Each widget update is a round trip to the browser, so only touch the
+                    # progress widgets when the active node actually changes
+                    last_node = None
+                    for i, state in enumerate(workflow_app.stream(initial_state)):
+                        for node, current_state in state.items():
+                            if node != "__end__":
+                                if current_state.get('status') == 'retrying':
+                                    retries = current_state.get('safety_check_retries', 0)
+                                    st.warning(f"⚠️ Safety check failed. Retrying report drafting (Attempt {retries} of 2)...")
+                                elif node != last_node:
+                                    # Otherwise, show the normal progress messages
+                                    progress_value = (STEPS.index(node) + 1) / len(STEPS)
+                                    progress_bar.progress(progress_value)
+                                    status_message.info(STEP_MESSAGES.get(node, f'Processing {node}...'))
+                                last_node = node
+                                final_state = current_state
+
+                    # The workflow is done with the uploaded CSV at this point
+                    release_file_cache(file_save_path)
+
+                    # After the loop, hide the progress bar
+                    progress_bar.empty()
+                    status_message.empty()
+
+                    # Keep the result for reruns triggered by other widgets (e.g. the download button),
+                    # minus the DataFrame, which is only needed while the workflow runs
+                    st.session_state["final_state"] = {k: v for k, v in final_state.items() if k != "dataframe"}
+                    st.session_state["final_state_key"] = result_key
+                    render_report(final_state)
+
+            except Exception as e:
+                st.info("You can try running the process again.")
+                st.error(f"❌ An unexpected critical error occurred during graph execution: {e}")
+                logger.error(f"An unexpected critical error occurred during graph execution:: {e}", exc_info=True)
+                st.stop()
+        finally:
+            st.session_state["in_flight"] = False
+    elif st.session_state.get("final_state_key") == result_key:
+        # Rerun without a new click: show the report already generated for this upload
+        render_report(st.session_state["final_state"])
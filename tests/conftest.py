@@ -1,5 +1,280 @@
 # tests/conftest.py
 import sys
 import os
+import json
+import types
+from functools import partial
+from unittest.mock import MagicMock, patch
+
+import pytest
+from langchain_core.messages import AIMessage
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Agent modules whose ChatGoogleGenerativeAI symbol is replaced by MockLLM for the whole session
+LLM_NODE_MODULES = [
+    'data_analysis_node',
+    'visualization_node',
+    'insight_generation_node',
+    'report_drafting_node',
+    'safety_node',
+]
+
+# Tests import the agents as src.agents.*, while the graph builder imports them as agents.*
+# (via PYTHONPATH=./src). These are distinct module objects, so both are patched.
+AGENT_PACKAGES = ['src.agents', 'agents']
+
+# Node functions replaced by MagicMocks in the session-compiled mocked graph
+MOCKED_GRAPH_NODES = [
+    'data_analysis_node',
+    'visualization_node',
+    'insight_generation_node',
+    'report_drafting_node',
+    'report_finalization_node',
+]
+
+
+def pytest_addoption(parser):
+    parser.addoption("--runlive", action="store_true", default=False,
+                     help="Run tests marked e2e_live, which call the real Gemini API.")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "e2e_live: end-to-end test against the real Gemini API (needs --runlive)")
+    # Installed before any test runs, so report_finalization_node's lazy import picks up the stub.
+    # Live runs render a real PDF and keep the real library.
+    if not config.getoption("--runlive"):
+        _stub_weasyprint()
+
+
+def _stub_weasyprint():
+    """
+    Installs a stand-in weasyprint module, so the suite never loads the real library
+    and its cairo/pango native libraries.
+    """
+    stub = types.ModuleType('weasyprint')
+    stub.HTML = MagicMock(name='weasyprint.HTML')
+    sys.modules['weasyprint'] = stub
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--runlive"):
+        return
+    skip_live = pytest.mark.skip(reason="live API test; use --runlive to run")
+    for item in items:
+        if "e2e_live" in item.keywords:
+            item.add_marker(skip_live)
+
+
+class MockLLM:
+    """
+    A lightweight stand-in for ChatGoogleGenerativeAI.
+    Accepts any constructor arguments and answers every invoke() with a prebuilt AIMessage,
+    so tests never build the Gemini client or autospec its class.
+    Responses registered for a node with set_responses() take precedence over the shared one.
+    """
+    _EMPTY_RESPONSE = AIMessage(content="")
+    _next_response = _EMPTY_RESPONSE
+    _responses = {}
+    _counters = {}
+    calls = []
+
+    def __init__(self, node=None, **kwargs):
+        self.node = node
+
+    def invoke(self, *args, **kwargs):
+        MockLLM.calls.append((args, kwargs))
+        replies = MockLLM._responses.get(self.node)
+        if not replies:
+            return MockLLM._next_response
+        index = MockLLM._counters.get(self.node, 0)
+        MockLLM._counters[self.node] = index + 1
+        return replies[index % len(replies)]
+
+    @staticmethod
+    def as_message(content):
+        """
+        Builds the AIMessage for a response: an AIMessage is used as-is, a string becomes its content,
+        and anything else is sent as a fenced JSON block. Call at import time to prebuild fixed payloads.
+        """
+        if isinstance(content, AIMessage):
+            return content
+        if not isinstance(content, str):
+            content = f"```json\n{json.dumps(content)}\n```"
+        return AIMessage(content=content)
+
+    @classmethod
+    def set_response(cls, content):
+        """Sets the response returned by invoke() for any node without its own responses."""
+        cls._next_response = cls.as_message(content)
+
+    @classmethod
+    def set_responses(cls, responses):
+        """
+        Registers recorded responses keyed by agent module name (e.g. 'safety_node').
+        A list of responses is replayed in order and cycles once exhausted.
+        """
+        for node, replies in responses.items():
+            if not isinstance(replies, list):
+                replies = [replies]
+            cls._responses[node] = [cls.as_message(reply) for reply in replies]
+            cls._counters[node] = 0
+
+    @classmethod
+    def reset(cls):
+        cls._next_response = cls._EMPTY_RESPONSE
+        cls._responses = {}
+        cls._counters = {}
+        cls.calls = []
+
+
+TEST_CSV_CONTENT = """date,sales,category
+2023-01-01,150.50,A
+2023-01-02,200.75,B
+2023-01-03,125.20,A
+2023-01-04,300.10,C
+2023-01-05,175.90,B
+"""
+
+
+@pytest.fixture(scope="session")
+def setup_test_data(tmp_path_factory):
+    """
+    Creates a temporary test directory with a dummy CSV file and chart/report output directories,
+    once per session (per worker under xdist). Returns (csv_path, chart_output_dir, report_output_dir).
+    """
+    test_dir = tmp_path_factory.mktemp("e2e_test_data")
+    csv_path = test_dir / "e2e_data.csv"
+    report_output_dir = test_dir / "reports"
+    chart_output_dir = test_dir / "charts"
+
+    report_output_dir.mkdir()
+    chart_output_dir.mkdir()
+    csv_path.write_text(TEST_CSV_CONTENT)
+
+    return str(csv_path), str(chart_output_dir), str(report_output_dir)
+
+
+@pytest.fixture(scope="session")
+def sample_data_profile():
+    """
+    The shared validated DataProfile from tests/fixtures_llm.py. Nodes only read it;
+    tests that need a variant should derive one with model_copy(update=...).
+    """
+    from tests.fixtures_llm import DATA_PROFILE
+    return DATA_PROFILE
+
+
+@pytest.fixture(scope="session")
+def sample_report_draft():
+    """
+    The shared validated ReportSectionsDraft from tests/fixtures_llm.py. Nodes only read it;
+    tests that need a variant should derive one with model_copy(update=...).
+    """
+    from tests.fixtures_llm import REPORT_DRAFT
+    return REPORT_DRAFT
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _dummy_api_key(request, session_mocker):
+    """
+    Sets a dummy GEMINI_API_KEY for the whole session so the agents get past their API key check.
+    Tests of the missing-key path clear the environment themselves.
+    Live runs (--runlive) keep the real key from the environment.
+    """
+    if request.config.getoption("--runlive"):
+        return
+    session_mocker.patch.dict(os.environ, {"GEMINI_API_KEY": "dummy_api_key"})
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _patch_llm(session_mocker):
+    """Installs MockLLM in every LLM-backed agent module once for the whole test session."""
+    for package in AGENT_PACKAGES:
+        for module in LLM_NODE_MODULES:
+            session_mocker.patch(f'{package}.{module}.ChatGoogleGenerativeAI', new=partial(MockLLM, node=module))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _stub_savefig(session_mocker):
+    """
+    Turns plt.savefig into a no-op for the session, so generating charts never rasterizes or encodes PNGs.
+    Figures are still created and closed as usual. Returns the real savefig for real_savefig.
+    """
+    import matplotlib.pyplot
+    original_savefig = matplotlib.pyplot.savefig
+    session_mocker.patch.object(matplotlib.pyplot, 'savefig', MagicMock(name='savefig'))
+    return original_savefig
+
+
+@pytest.fixture
+def real_savefig(mocker, _stub_savefig):
+    """Restores the real plt.savefig for a test that checks the rendered chart file."""
+    import matplotlib.pyplot
+    mocker.patch.object(matplotlib.pyplot, 'savefig', _stub_savefig)
+
+
+@pytest.fixture(autouse=True)
+def _reset_mock_llm():
+    """Ensures a response configured in one test doesn't leak into the next."""
+    MockLLM.reset()
+    yield
+    MockLLM.reset()
+
+
+@pytest.fixture(scope="session")
+def mock_llm():
+    """Gives tests access to the session-wide MockLLM to configure responses and inspect calls."""
+    return MockLLM
+
+
+@pytest.fixture(scope="session")
+def compiled_app():
+    """The real report generation workflow, compiled once per session."""
+    from src.graph.builder import create_graph_workflow
+    return create_graph_workflow()
+
+
+@pytest.fixture(scope="session")
+def _mocked_graph():
+    """
+    Compiles the workflow once with MagicMock node functions.
+    LangGraph binds node callables when the graph is compiled, so the mocks must be in place
+    during create_graph_workflow(); patching the builder module afterwards has no effect on the app.
+    """
+    from src.graph.builder import create_graph_workflow
+    node_mocks = {name: MagicMock(name=name) for name in MOCKED_GRAPH_NODES}
+    with patch.multiple('src.graph.builder', **node_mocks):
+        app = create_graph_workflow()
+    return app, node_mocks
+
+
+@pytest.fixture
+def mocked_app(_mocked_graph):
+    """The session-compiled workflow whose node functions are the mocks from node_mocks."""
+    return _mocked_graph[0]
+
+
+@pytest.fixture
+def node_mocks(_mocked_graph):
+    """The mocked node functions of mocked_app, keyed by function name and reset for every test."""
+    mocks = _mocked_graph[1]
+    for mock in mocks.values():
+        mock.reset_mock(return_value=True, side_effect=True)
+    return mocks
+
+
+@pytest.fixture
+def weasyprint_html(mocker):
+    """
+    The weasyprint.HTML stand-in, reset for each test.
+    With --runlive the real library is used, so a mock is patched into the agent modules instead.
+    """
+    html = getattr(sys.modules.get('weasyprint'), 'HTML', None)
+    if isinstance(html, MagicMock):
+        html.reset_mock(return_value=True, side_effect=True)
+        return html
+    html = MagicMock(name='weasyprint.HTML')
+    for package in AGENT_PACKAGES:
+        mocker.patch(f'{package}.report_finalization_node._get_html', return_value=html)
+    return html
@@ -0,0 +1,63 @@
+"""
+Canned LLM payloads and validated schema instances shared across the test modules.
+Everything here is built once at import. The nodes only read these models, so tests that
+need to change one should derive a copy with model_copy(deep=True) or model_copy(update=...).
+"""
+import json
+
+from schemas.messages import DataProfile, GeneratedVisual, AnalysisInsight, ReportSectionsDraft
+
+# --- Canned LLM response contents, one per LLM-backed agent ---
+PROFILE_JSON = '{"num_rows": 5, "num_columns": 3, "column_details": {}, "key_observations": "Mock observations"}'
+VISUALIZATION_CONTENT = """```json
+{
+    "suggestions": [
+        {"type": "line", "columns": ["date", "sales"], "title": "Sales Trend Over Time", "description": "Shows how sales have changed over the recorded period.", "suggested_section": "Key Findings"},
+        {"type": "bar", "columns": ["category"], "title": "Sales Count by Category", "description": "Displays the distribution of sales across different product categories.", "suggested_section": "Key Findings"}
+    ]
+}
+```"""
+INSIGHTS_JSON = json.dumps({"insights": [{"insight_id": "insight_1", "title": "Mock Insight 1", "narrative": "Mock narrative for insight 1.", "suggested_section": "Introduction"}, {"insight_id": "insight_2", "title": "Mock Insight 2", "narrative": "Mock narrative for insight 2.", "suggested_section": "Key Findings"}]})
+DRAFT_JSON = '{"introduction_text": "Mock intro.", "analysis_narratives": ["Mock narrative 1", "Mock narrative 2"], "key_takeaways_bullet_points": ["Mock takeaway 1", "Mock takeaway 2"], "conclusion_text": "Mock conclusion.", "dataset_title": "Mock Title", "figure_id_map": {"[FIGURE 1]": "chart_1"}, "clarification_questions": []}'
+SAFETY_JSON = json.dumps({"is_safe": True, "is_accurate": True, "reasoning": "The report is safe and accurate."})
+
+# The responses above keyed by agent module, as MockLLM.set_responses() expects them
+LLM_FIXTURES = {
+    "data_analysis_node": PROFILE_JSON,
+    "visualization_node": VISUALIZATION_CONTENT,
+    "insight_generation_node": INSIGHTS_JSON,
+    "report_drafting_node": DRAFT_JSON,
+    "safety_node": SAFETY_JSON,
+}
+
+# --- Validated node inputs ---
+DATA_PROFILE = DataProfile(
+    num_rows=100,
+    num_columns=5,
+    column_details={"sales": {"type": "float64"}, "region": {"type": "object"}},
+    key_observations="Sales data shows regional variations."
+)
+GENERATED_VISUAL = GeneratedVisual(
+    visual_id="chart_1",
+    type="bar_chart",
+    file_path="local_app_data/charts/chart_1.png",
+    description="Bar chart showing sales by region.",
+    code="mock_code_1",
+    suggested_section="Key Findings"
+)
+ANALYSIS_INSIGHT = AnalysisInsight(
+    insight_id="insight_1",
+    title="Regional Sales Performance",
+    narrative="North America has the highest sales.",
+    suggested_section="Key Findings",
+    supporting_visual_ids=["chart_1"]
+)
+REPORT_DRAFT = ReportSectionsDraft(
+    introduction_text="This is a mock introduction.",
+    analysis_narratives=["Regional Sales Performance:- The key finding is here, as shown in [FIGURE 1]."],
+    key_takeaways_bullet_points=["Key takeaway 1", "Key takeaway 2"],
+    conclusion_text="This is a mock conclusion.",
+    dataset_title="Mock Data Analysis",
+    figure_id_map={"[FIGURE 1]": "chart_1"},
+    clarification_questions=[]
+)
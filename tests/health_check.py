@@ -1,7 +1,8 @@
 import streamlit as st
 import os
 import sys
-import importlib.util
+import re
+import importlib.metadata
 import google.generativeai as genai
 from dotenv import load_dotenv
 
@@ -20,12 +21,27 @@ def check_env_var():
         return "❌ Missing GEMINI_API_KEY in environment variables."
     return "✅ GEMINI_API_KEY found."
 
-def check_dependency(package_name):
+def normalize_package_name(name):
+    """Normalizes a distribution name as pip does (PEP 503), e.g. `Langchain_Core` -> `langchain-core`."""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+def get_installed_distributions():
+    """Returns the normalized names of all installed distributions, read in a single metadata scan."""
+    return {
+        normalize_package_name(dist.metadata["Name"])
+        for dist in importlib.metadata.distributions()
+        if dist.metadata["Name"]
+    }
+
+def check_dependency(package_name, installed=None):
     """Checks if a specific Python package is installed."""
     try:
         package_name = package_name.split('==')[0].split('<')[0].split('>')[0].split('~')[0].strip()
-        spec = importlib.util.find_spec(package_name)
-        if spec is None:
+        if installed is None:
+            installed = get_installed_distributions()
+        # Requirements list distribution names, which often differ from the import name
+        # (python-dotenv vs dotenv), so look them up in the package metadata rather than with find_spec
+        if normalize_package_name(package_name) not in installed:
             return f"❌ Missing dependency: {package_name}"
         return f"✅ {package_name} is installed."
     except Exception as e:
@@ -73,8 +89,9 @@ def run_health_check():
     st.markdown("##### 📦 Checking All Required Libraries...")
     required_packages = get_required_packages()
     if required_packages:
-        for pkg in required_packages:
-            st.text(check_dependency(pkg))
+        installed = get_installed_distributions()
+        results = [check_dependency(pkg, installed) for pkg in required_packages]
+        st.text("\n".join(results))
 
     st.markdown("\n##### ✅ Health check completed.")
 
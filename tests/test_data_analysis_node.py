@@ -1,13 +1,57 @@
 import pytest
 import pandas as pd
+import functools
+import io
 import json
 import os
-from unittest.mock import MagicMock
 from graph.state import GraphState
-from src.agents.data_analysis_node import data_analysis_node
+from src.agents.data_analysis_node import data_analysis_node, clear_observations_cache
 from schemas.messages import DataProfile
 
 
+@pytest.fixture(autouse=True)
+def clear_profiling_cache():
+    """Ensures cached profiling results from one test don't leak into another."""
+    clear_observations_cache()
+    yield
+    clear_observations_cache()
+
+
+SAMPLE_SALES_CSV = """id,sales,product
+1,100.5,A
+2,200.0,B
+3,150.25,C
+4,300.75,A
+"""
+
+SMALL_NUMERIC_CSV = "a\n1\n2\n"
+
+CATEGORICAL_CSV = """product,category
+A,X
+B,Y
+C,X
+A,Z
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def _cached_df(csv_text: str) -> pd.DataFrame:
+    """Parses a CSV snippet through the real pandas parser once per test session."""
+    return pd.read_csv(io.StringIO(csv_text))
+
+
+@pytest.fixture
+def sample_sales_df():
+    """A small sales DataFrame; a shallow copy of the cached parse, since the node only reads it."""
+    return _cached_df(SAMPLE_SALES_CSV).copy(deep=False)
+
+
+@pytest.fixture
+def small_numeric_df():
+    """A single numeric column with two rows."""
+    return _cached_df(SMALL_NUMERIC_CSV).copy(deep=False)
+
+
 @pytest.fixture
 def mock_graph_state():
     """Provides a default GraphState fixture for tests."""
@@ -18,28 +62,13 @@ def mock_graph_state():
     )
 
 
-def setup_llm_mock(mocker, content):
-    """A helper function to set up the LLM mock for different test cases."""
-    mock_llm_response = MagicMock()
-    mock_llm_response.content = content
-    # Patch the LLM where it's imported in data_analysis_node
-    mock_llm = mocker.patch('src.agents.data_analysis_node.ChatGoogleGenerativeAI', autospec=True)
-    mock_llm_instance = mock_llm.return_value
-    mock_llm_instance.invoke.return_value = mock_llm_response
-
-def test_data_analysis_node_success(mock_graph_state, mocker):
+def test_data_analysis_node_success(mock_graph_state, mocker, mock_llm, sample_sales_df):
     """
     Tests the successful execution of the data_analysis_node.
     Mocks file reading and LLM response.
     """
     # 1. Mock pandas to return a sample DataFrame
-    sample_data = {
-        'id': [1, 2, 3, 4],
-        'sales': [100.5, 200.0, 150.25, 300.75],
-        'product': ['A', 'B', 'C', 'A']
-    }
-    mock_df = pd.DataFrame(sample_data)
-    mocker.patch('pandas.read_csv', return_value=mock_df)
+    mocker.patch('pandas.read_csv', return_value=sample_sales_df)
 
     # 2. Mock the environment variable for the API key
     mocker.patch.dict(os.environ, {'GEMINI_API_KEY': 'mock_api_key'})
@@ -51,7 +80,7 @@ def test_data_analysis_node_success(mock_graph_state, mocker):
         "column_details": {},
         "key_observations": "The dataset has 4 rows and 3 columns."
     }
-    setup_llm_mock(mocker, json.dumps(llm_content))
+    mock_llm.set_response(json.dumps(llm_content))
 
     # 4. Call the function
     updated_state = data_analysis_node(mock_graph_state)
@@ -62,24 +91,48 @@ def test_data_analysis_node_success(mock_graph_state, mocker):
     assert isinstance(updated_state['dataframe_profile'], DataProfile)
     assert updated_state['dataframe_profile'].num_rows == 4
     assert updated_state['dataframe_profile'].num_columns == 3
+    assert updated_state['dataframe'] is sample_sales_df
+
+
+def test_data_analysis_node_reuses_cached_profile(mock_graph_state, mocker, mock_llm):
+    """
+    Tests that profiling the same data with the same instructions twice
+    only invokes the LLM once.
+    """
+    mocker.patch('pandas.read_csv', return_value=pd.DataFrame({'id': [1, 2, 3], 'sales': [10.0, 20.0, 30.0]}))
+    mocker.patch.dict(os.environ, {'GEMINI_API_KEY': 'mock_api_key'})
+    mock_llm.set_response(json.dumps({
+        "num_rows": 3,
+        "num_columns": 2,
+        "column_details": {},
+        "key_observations": "Cached observations."
+    }))
+
+    first_state = data_analysis_node(dict(mock_graph_state))
+    second_state = data_analysis_node(dict(mock_graph_state))
+
+    assert first_state['status'] == second_state['status'] == "data_profiled"
+    assert second_state['dataframe_profile'].key_observations == "Cached observations."
+    assert second_state['dataframe_profile'] == first_state['dataframe_profile']
+    assert len(mock_llm.calls) == 1
 
 
 @pytest.mark.parametrize("instructions, expected_status, expected_message", [
     ("Tell me a joke about dogs.", "error", "User instructions were not related to data report generation."),
     ("Who is the president of the US?", "error", "User instructions were not related to data report generation."),
 ])
-def test_data_analysis_node_invalid_instructions_parametrized(mock_graph_state, mocker, instructions, expected_status,
-                                                              expected_message):
+def test_data_analysis_node_invalid_instructions_parametrized(mock_graph_state, mocker, mock_llm, small_numeric_df,
+                                                              instructions, expected_status, expected_message):
     """
     Tests the safety guardrail with multiple invalid instruction examples
     using pytest.mark.parametrize.
     """
     mock_graph_state['instructions'] = instructions
     mocker.patch.dict(os.environ, {'GEMINI_API_KEY': 'mock_api_key'})
-    mocker.patch('pandas.read_csv', return_value=pd.DataFrame({'a': [1, 2]}))
+    mocker.patch('pandas.read_csv', return_value=small_numeric_df)
 
     llm_decline_message = "I am a report generator AI and do not have information on that topic. Please give instructions related to data report generation."
-    setup_llm_mock(mocker, llm_decline_message)
+    mock_llm.set_response(llm_decline_message)
 
     updated_state = data_analysis_node(mock_graph_state)
 
@@ -87,14 +140,48 @@ def test_data_analysis_node_invalid_instructions_parametrized(mock_graph_state,
     assert expected_message in updated_state['error_message']
 
 
+@pytest.mark.parametrize("instructions, declined", [
+    ("Write a poem about the weather.", True),
+    ("Tell me a story.", True),
+    ("What is the stock price of Google today?", True),
+    # Data requests that merely mention these topics are left to the LLM, which sees the columns
+    ("Plot stock prices over time", False),
+    ("Which stories got the most views?", False),
+    ("Compare email open rates by campaign", False),
+    ("Show weather patterns by month", False),
+    ("Translate column names to English and chart sales", False),
+])
+def test_data_analysis_node_off_topic_instructions_skip_llm(mock_graph_state, mocker, mock_llm, small_numeric_df,
+                                                            instructions, declined):
+    """
+    Tests that clearly off-topic instructions are declined locally, without reading the CSV
+    or invoking the LLM, while data requests on similar subjects still reach the LLM.
+    """
+    mock_graph_state['instructions'] = instructions
+    mocker.patch.dict(os.environ, {'GEMINI_API_KEY': 'mock_api_key'})
+    mock_read_csv = mocker.patch('pandas.read_csv', return_value=small_numeric_df)
+    mock_llm.set_response("I am a report generator AI and do not have information on that topic. "
+                          "Please give instructions related to data report generation.")
+
+    updated_state = data_analysis_node(mock_graph_state)
+
+    assert updated_state['status'] == "error"
+    assert "User instructions were not related to data report generation." in updated_state['error_message']
+    if declined:
+        mock_read_csv.assert_not_called()
+        assert mock_llm.calls == []
+    else:
+        mock_read_csv.assert_called_once()
+        assert len(mock_llm.calls) == 1
+
 
-def test_data_analysis_node_llm_missing_json_field(mock_graph_state, mocker):
+def test_data_analysis_node_llm_missing_json_field(mock_graph_state, mocker, mock_llm, small_numeric_df):
     """
     Tests error handling when the LLM returns valid JSON but with a required
     field (e.g., 'key_observations') missing.
     """
     mocker.patch.dict(os.environ, {'GEMINI_API_KEY': 'mock_api_key'})
-    mocker.patch('pandas.read_csv', return_value=pd.DataFrame({'a': [1, 2]}))
+    mocker.patch('pandas.read_csv', return_value=small_numeric_df)
 
     # Mock LLM to return valid JSON but with a missing required field
     llm_content = {
@@ -103,7 +190,7 @@ def test_data_analysis_node_llm_missing_json_field(mock_graph_state, mocker):
         "column_details": {"a": {"type": "int64"}}
         # 'key_observations' is missing
     }
-    setup_llm_mock(mocker, json.dumps(llm_content))
+    mock_llm.set_response(json.dumps(llm_content))
 
     updated_state = data_analysis_node(mock_graph_state)
 
@@ -115,17 +202,12 @@ def test_data_analysis_node_llm_missing_json_field(mock_graph_state, mocker):
 # -----------------------------------------------------------------------------
 # Test for a CSV with only non-numeric columns
 # -----------------------------------------------------------------------------
-def test_data_analysis_node_non_numeric_only_csv(mock_graph_state, mocker):
+def test_data_analysis_node_non_numeric_only_csv(mock_graph_state, mocker, mock_llm):
     """
     Tests that the node correctly profiles a dataset containing only
     non-numeric columns.
     """
-    sample_data = {
-        'product': ['A', 'B', 'C', 'A'],
-        'category': ['X', 'Y', 'X', 'Z']
-    }
-    mock_df = pd.DataFrame(sample_data)
-    mocker.patch('pandas.read_csv', return_value=mock_df)
+    mocker.patch('pandas.read_csv', return_value=_cached_df(CATEGORICAL_CSV).copy(deep=False))
     mocker.patch.dict(os.environ, {'GEMINI_API_KEY': 'mock_api_key'})
 
     llm_content = {
@@ -134,7 +216,7 @@ def test_data_analysis_node_non_numeric_only_csv(mock_graph_state, mocker):
         "column_details": {},
         "key_observations": "Dataset contains two categorical columns: 'product' and 'category'."
     }
-    setup_llm_mock(mocker, json.dumps(llm_content))
+    mock_llm.set_response(json.dumps(llm_content))
 
     updated_state = data_analysis_node(mock_graph_state)
 
@@ -180,12 +262,12 @@ def test_data_analysis_node_empty_csv(mock_graph_state, mocker):
     assert "Uploaded CSV is empty" in updated_state['error_message']
 
 
-def test_data_analysis_node_llm_invalid_json(mock_graph_state, mocker):
+def test_data_analysis_node_llm_invalid_json(mock_graph_state, mocker, mock_llm, small_numeric_df):
     # This test remains unchanged
     mocker.patch.dict(os.environ, {'GEMINI_API_KEY': 'mock_api_key'})
-    mocker.patch('pandas.read_csv', return_value=pd.DataFrame({'a': [1, 2]}))
+    mocker.patch('pandas.read_csv', return_value=small_numeric_df)
 
-    setup_llm_mock(mocker, "this is not valid json")
+    mock_llm.set_response("this is not valid json")
 
     updated_state = data_analysis_node(mock_graph_state)
 
@@ -1,11 +1,10 @@
 import pytest
 import os
 import pandas as pd
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 
 # Import all necessary classes and functions
 from src.graph.state import GraphState
-from src.graph.builder import create_graph_workflow
 from schemas.messages import ReportSectionsDraft, ReportFormat, GeneratedVisual, DataProfile, AnalysisInsight, \
     VisualGenerationInstruction
 from src.agents.data_analysis_node import data_analysis_node
@@ -15,49 +14,38 @@ from src.agents.report_drafting_node import report_drafting_node
 from src.agents.report_finalization_node import report_finalization_node
 
 import json
-
-
-@pytest.fixture(scope="module")
-def setup_test_data(tmpdir_factory):
-    """
-    Creates a temporary test directory and a dummy CSV file.
-    This fixture is crucial for E2E tests as it sets up a real-world file system scenario.
-    """
-    test_dir = tmpdir_factory.mktemp("e2e_test_data")
-    csv_path = os.path.join(test_dir, "e2e_data.csv")
-    report_output_dir = os.path.join(test_dir, "reports")
-    chart_output_dir = os.path.join(test_dir, "charts")
-
-    os.makedirs(report_output_dir, exist_ok=True)
-    os.makedirs(chart_output_dir, exist_ok=True)
-
-    csv_content = """date,sales,category
-2023-01-01,150.50,A
-2023-01-02,200.75,B
-2023-01-03,125.20,A
-2023-01-04,300.10,C
-2023-01-05,175.90,B
-"""
-    with open(csv_path, 'w') as f:
-        f.write(csv_content)
-
-    yield csv_path, chart_output_dir, report_output_dir
-
-    # Teardown: Clean up the dummy chart file if it exists
-    if os.path.exists(csv_path):
-        os.remove(csv_path)
+from langchain_core.messages import AIMessage
+
+
+# Recorded LLM responses for the isolated node tests, serialized once at import
+_ANALYSIS_RESPONSE = AIMessage(
+    content='{"num_rows": 5, "num_columns": 3, "column_details": {}, "key_observations": "Mock analysis"}')
+_VISUALIZATION_RESPONSE = AIMessage(content=json.dumps({
+    "suggestions": [
+        {"type": "bar", "columns": ["category"], "title": "Sales by Category",
+         "description": "Bar chart showing sales by category.", "suggested_section": "Key Findings"}
+    ]
+}))
+_DRAFT_RESPONSE = AIMessage(content=json.dumps({
+    "introduction_text": "Mock intro.",
+    "analysis_narratives": ["Mock narrative for Category C with a reference to [FIGURE 1]."],
+    "key_takeaways_bullet_points": ["Mock takeaway."],
+    "conclusion_text": "Mock conclusion.",
+    "dataset_title": "E2E Report",
+    "figure_id_map": {"[FIGURE 1]": "chart_1"},
+    "clarification_questions": []
+}))
 
 
 # --- Test 1: Test the data_analysis_node in isolation ---
-@patch('src.agents.data_analysis_node.ChatGoogleGenerativeAI', api_key='dummy_api_key')
 @patch('src.agents.data_analysis_node.pd.read_csv', side_effect=pd.read_csv)
-def test_data_analysis_node(mock_pd_read_csv, mock_llm, setup_test_data):
+def test_data_analysis_node(mock_pd_read_csv, setup_test_data, mock_llm):
     """
     Tests that the data analysis node correctly processes the CSV and
     generates a data profile.
     """
     csv_path, _, _ = setup_test_data
-    mock_llm.return_value.invoke.return_value.content = '{"num_rows": 5, "num_columns": 3, "column_details": {}, "key_observations": "Mock analysis"}'
+    mock_llm.set_response(_ANALYSIS_RESPONSE)
 
     initial_state = GraphState(
         request_id="test_analysis",
@@ -74,19 +62,13 @@ def test_data_analysis_node(mock_pd_read_csv, mock_llm, setup_test_data):
 
 
 # --- Test 2: Test the visualization_node in isolation ---
-@patch('src.agents.visualization_node.ChatGoogleGenerativeAI', api_key='dummy_api_key')
-def test_visualization_node(mock_llm, setup_test_data):
+def test_visualization_node(setup_test_data, mock_llm):
     """
     Tests that the visualization node correctly generates a visual instruction
     given a data profile.
     """
     csv_path, _, _ = setup_test_data
-    mock_llm.return_value.invoke.return_value.content = json.dumps({
-        "suggestions": [
-            {"type": "bar", "columns": ["category"], "title": "Sales by Category",
-             "description": "Bar chart showing sales by category.", "suggested_section": "Key Findings"}
-        ]
-    })
+    mock_llm.set_response(_VISUALIZATION_RESPONSE)
 
     pre_viz_state = GraphState(
         request_id="test_viz",
@@ -103,22 +85,13 @@ def test_visualization_node(mock_llm, setup_test_data):
     assert isinstance(result_state['generated_visuals'][0], GeneratedVisual)
 
 
-@patch('src.agents.report_drafting_node.ChatGoogleGenerativeAI', api_key='dummy_api_key')
-def test_report_drafting_node(mock_llm, setup_test_data):
+def test_report_drafting_node(setup_test_data, mock_llm):
     """
     Tests that the report drafting node correctly creates a report draft
     from a set of insights and visuals.
     """
     csv_path, chart_output_dir, report_output_dir = setup_test_data
-    mock_llm.return_value.invoke.return_value.content = json.dumps({
-        "introduction_text": "Mock intro.",
-        "analysis_narratives": ["Mock narrative for Category C with a reference to [FIGURE 1]."],
-        "key_takeaways_bullet_points": ["Mock takeaway."],
-        "conclusion_text": "Mock conclusion.",
-        "dataset_title": "E2E Report",
-        "figure_id_map": {"[FIGURE 1]": "chart_1"},
-        "clarification_questions": []
-    })
+    mock_llm.set_response(_DRAFT_RESPONSE)
 
     mock_visual = GeneratedVisual(
         visual_id="chart_1",
@@ -154,14 +127,11 @@ def test_report_drafting_node(mock_llm, setup_test_data):
 
 
 # --- Test 4: Test the report_finalization_node in isolation ---
-@patch('src.agents.report_finalization_node.HTML')
-def test_report_finalization_node_direct(mock_weasyprint_html, setup_test_data):
+def test_report_finalization_node_direct(setup_test_data, weasyprint_html):
     """
     Tests the report_finalization_node in isolation to verify its logic.
     """
     csv_path, chart_output_dir, report_output_dir = setup_test_data
-    mock_write_pdf = MagicMock()
-    mock_weasyprint_html.return_value.write_pdf = mock_write_pdf
 
     mock_visual = GeneratedVisual(
         visual_id="chart_1",
@@ -198,7 +168,7 @@ def test_report_finalization_node_direct(mock_weasyprint_html, setup_test_data):
     final_state = report_finalization_node(test_state)
 
     assert final_state['status'] == "report_finalized"
-    mock_weasyprint_html.return_value.write_pdf.assert_called_once()
+    weasyprint_html.return_value.write_pdf.assert_called_once()
 
     os.remove(mock_visual.file_path)
 
@@ -206,16 +176,22 @@ def test_report_finalization_node_direct(mock_weasyprint_html, setup_test_data):
 # --- Test 5: End-to-end test of the full workflow ---
 # NOTE: The mocks for the LLM and plt.savefig have been removed
 # to allow for a true end-to-end test. This test will now use the actual LLM and
-# chart generation logic.
-def test_full_e2e_workflow_unmocked(setup_test_data):
+# chart generation logic. It is skipped unless pytest is run with --runlive.
+@pytest.mark.e2e_live
+def test_full_e2e_workflow_unmocked(setup_test_data, compiled_app, real_savefig, mocker):
     """
     Performs a full end-to-end test of the entire LangGraph workflow.
     This test now runs with the real LLM and chart generation.
     """
     csv_path, chart_output_dir, report_output_dir = setup_test_data
 
-    # Instantiate the workflow and initial state
-    workflow = create_graph_workflow()
+    # Undo the session-wide MockLLM patch for the modules the compiled graph runs
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    for module in ['data_analysis_node', 'visualization_node', 'insight_generation_node',
+                   'report_drafting_node', 'safety_node']:
+        mocker.patch(f'agents.{module}.ChatGoogleGenerativeAI', new=ChatGoogleGenerativeAI)
+
+    # The workflow is compiled once per session by the compiled_app fixture
     initial_state = {
         "request_id": "test_full_e2e",
         "file_path": csv_path,
@@ -226,7 +202,7 @@ def test_full_e2e_workflow_unmocked(setup_test_data):
     }
 
     # Run the workflow
-    final_state = workflow.invoke(initial_state)
+    final_state = compiled_app.invoke(initial_state)
 
     # Assertions for the final state
     assert final_state['status'] == "report_finalized"
@@ -235,3 +211,54 @@ def test_full_e2e_workflow_unmocked(setup_test_data):
     assert 'generated_visuals' in final_state
     # Corrected assertion to be more flexible, matching the LLM's prompt.
     assert 1 <= len(final_state['generated_visuals']) <= 3
+
+
+# --- Test 6: End-to-end run of the full workflow against recorded LLM responses ---
+def test_full_e2e_workflow_replay(setup_test_data, compiled_app, mock_llm, weasyprint_html, mocker):
+    """
+    Runs the whole compiled graph offline: every node gets a recorded LLM response,
+    and chart saving and PDF rendering are no-ops.
+    """
+    csv_path, chart_output_dir, report_output_dir = setup_test_data
+    mock_savefig = mocker.patch('matplotlib.pyplot.savefig')
+
+    mock_llm.set_responses({
+        'data_analysis_node': {"num_rows": 5, "num_columns": 3, "column_details": {},
+                               "key_observations": "Sales vary by category."},
+        'visualization_node': {"suggestions": [
+            {"type": "bar", "columns": ["category"], "title": "Sales by Category",
+             "description": "Bar chart showing sales by category.", "suggested_section": "Key Findings"}
+        ]},
+        'insight_generation_node': {"insights": [
+            {"insight_id": "insight_1", "title": "Category Mix", "narrative": "Category A and B dominate.",
+             "suggested_section": "Key Findings", "related_visual_ids": []}
+        ]},
+        'report_drafting_node': {
+            "introduction_text": "Replay intro.",
+            "analysis_narratives": ["Category A and B dominate, see [FIGURE 1]."],
+            "key_takeaways_bullet_points": ["Replay takeaway."],
+            "conclusion_text": "Replay conclusion.",
+            "dataset_title": "E2E Replay Report",
+            "figure_id_map": {},
+            "clarification_questions": []
+        },
+        'safety_node': {"is_safe": True, "is_accurate": True, "reasoning": "Consistent with the profile."},
+    })
+
+    initial_state = {
+        "request_id": "test_full_e2e_replay",
+        "file_path": csv_path,
+        "instructions": "Generate a full report.",
+        "chart_output_dir": chart_output_dir,
+        "report_output_dir": report_output_dir,
+        "status": "initial",
+        "safety_check_retries": 0,
+    }
+
+    final_state = compiled_app.invoke(initial_state)
+
+    assert final_state['status'] == "report_finalized"
+    assert final_state['report_sections_draft'].dataset_title == "E2E Replay Report"
+    assert len(final_state['generated_visuals']) == 1
+    mock_savefig.assert_called_once()
+    weasyprint_html.return_value.write_pdf.assert_called_once()
@@ -1,20 +1,37 @@
 import pytest
 import os
 import json
-from unittest.mock import MagicMock
 from langchain_core.messages import AIMessage
 from graph.state import GraphState
 from src.agents.insight_generation_node import insight_generation_node
 from schemas.messages import DataProfile, GeneratedVisual, AnalysisInsight
 from pydantic import ValidationError
 
+def _fenced_json_message(content):
+    """Wraps a payload the way Gemini returns JSON: a fenced ```json block."""
+    return AIMessage(content=f"```json\n{json.dumps(content)}\n```")
+
+
+# LLM responses are serialized once at import rather than in every test.
+# FIX: Corrected field name from 'summary' to 'narrative'
+_MOCK_INSIGHTS = [
+    {"insight_id": "insight_1", "title": "Sales by Region", "narrative": "North America has the highest sales.", "suggested_section": "Key Findings", "related_visual_ids": ["chart_1"]},
+    {"insight_id": "insight_2", "title": "Regional Consistency", "narrative": "Sales are consistent across other regions.", "suggested_section": "Key Findings", "related_visual_ids": []}
+]
+_LLM_INSIGHTS_SUCCESS = _fenced_json_message({"insights": _MOCK_INSIGHTS})
+_LLM_INSIGHTS_EMPTY = _fenced_json_message({"insights": []})
+_LLM_INSIGHTS_MISSING_TITLE = _fenced_json_message(
+    {"insights": [{"insight_id": "i1", "narrative": "Missing title.", "suggested_section": "Summary"}]})
+
+
 @pytest.fixture
 def mock_graph_state_for_insights():
     """
     Provides a mock GraphState with a valid data profile and generated visuals,
     simulating a successful run of previous nodes.
+    The models are built with model_construct since their payloads are known to be valid.
     """
-    mock_data_profile = DataProfile(
+    mock_data_profile = DataProfile.model_construct(
         num_rows=100,
         num_columns=5,
         column_details={
@@ -24,7 +41,7 @@ def mock_graph_state_for_insights():
         key_observations="Sales data shows regional variations."
     )
     mock_visuals = [
-        GeneratedVisual(
+        GeneratedVisual.model_construct(
             visual_id="chart_1",
             type="bar_chart",
             file_path="path/to/chart_1.png",
@@ -41,26 +58,10 @@ def mock_graph_state_for_insights():
         status="initial"
     )
 
-def setup_llm_mock(mocker, content):
-    """
-    A robust helper function that mocks the entire LLM prompt-response chain.
-    """
-    wrapped_content = f"```json\n{json.dumps(content)}\n```"
-    mock_llm_response = AIMessage(content=wrapped_content)
-    mock_llm_class = mocker.patch('src.agents.insight_generation_node.ChatGoogleGenerativeAI', autospec=True)
-    mock_llm_instance = mock_llm_class.return_value
-    mock_llm_instance.invoke.return_value = mock_llm_response
-
-def test_insight_generation_node_success(mock_graph_state_for_insights, mocker):
+def test_insight_generation_node_success(mock_graph_state_for_insights, mocker, mock_llm):
     """Tests the successful execution of the insight_generation_node."""
     mocker.patch.dict(os.environ, {'GEMINI_API_KEY': 'mock_api_key'})
-    # FIX: Corrected field name from 'summary' to 'narrative'
-    mock_insights = [
-        {"insight_id": "insight_1", "title": "Sales by Region", "narrative": "North America has the highest sales.", "suggested_section": "Key Findings", "related_visual_ids": ["chart_1"]},
-        {"insight_id": "insight_2", "title": "Regional Consistency", "narrative": "Sales are consistent across other regions.", "suggested_section": "Key Findings", "related_visual_ids": []}
-    ]
-    llm_content = {"insights": mock_insights}
-    setup_llm_mock(mocker, llm_content)
+    mock_llm.set_response(_LLM_INSIGHTS_SUCCESS)
     updated_state = insight_generation_node(mock_graph_state_for_insights)
     assert updated_state['status'] == "insights_generated"
     assert len(updated_state['analysis_insights']) == 2
@@ -68,7 +69,7 @@ def test_insight_generation_node_success(mock_graph_state_for_insights, mocker):
     assert updated_state['analysis_insights'][0].title == "Sales by Region"
 
 
-def test_insight_generation_node_no_inputs(mocker):
+def test_insight_generation_node_no_inputs(mocker, mock_llm):
     """
     Tests that the node correctly handles an empty state by returning an error.
     """
@@ -76,8 +77,7 @@ def test_insight_generation_node_no_inputs(mocker):
     empty_state = GraphState(request_id="empty_test", instructions="Summarize the data.", status="initial")
 
     # Mock LLM output, but the node should fail before this due to missing inputs
-    llm_content = {"insights": []}
-    setup_llm_mock(mocker, llm_content)
+    mock_llm.set_response(_LLM_INSIGHTS_EMPTY)
     updated_state = insight_generation_node(empty_state)
 
     # The node should correctly return an 'error' status because key inputs are missing.
@@ -85,13 +85,12 @@ def test_insight_generation_node_no_inputs(mocker):
     assert "Cannot generate insights" in updated_state['error_message']
 
 
-def test_insight_generation_node_empty_insights_list(mock_graph_state_for_insights, mocker):
+def test_insight_generation_node_empty_insights_list(mock_graph_state_for_insights, mocker, mock_llm):
     """
     Tests that the node correctly handles an empty list of insights from the LLM by returning an error.
     """
     mocker.patch.dict(os.environ, {'GEMINI_API_KEY': 'mock_api_key'})
-    llm_content = {"insights": []}
-    setup_llm_mock(mocker, llm_content)
+    mock_llm.set_response(_LLM_INSIGHTS_EMPTY)
     updated_state = insight_generation_node(mock_graph_state_for_insights)
 
     # The node should correctly return an 'error' status because no insights were generated.
@@ -107,19 +106,18 @@ def test_insight_generation_node_missing_api_key(mock_graph_state_for_insights,
     assert updated_state['status'] == "error"
     assert "API key for Gemini not found" in updated_state['error_message']
 
-def test_insight_generation_node_llm_invalid_json(mock_graph_state_for_insights, mocker):
+def test_insight_generation_node_llm_invalid_json(mock_graph_state_for_insights, mocker, mock_llm):
     """Tests error handling for invalid JSON from the LLM."""
     mocker.patch.dict(os.environ, {'GEMINI_API_KEY': 'mock_api_key'})
-    setup_llm_mock(mocker, "this is not valid json")
+    mock_llm.set_response("this is not valid json")
     updated_state = insight_generation_node(mock_graph_state_for_insights)
     assert updated_state['status'] == "error"
     assert "LLM output for insights was invalid JSON or schema" in updated_state['error_message']
 
-def test_insight_generation_node_llm_missing_fields(mock_graph_state_for_insights, mocker):
+def test_insight_generation_node_llm_missing_fields(mock_graph_state_for_insights, mocker, mock_llm):
     """Tests operational resilience when LLM returns JSON with missing fields."""
     mocker.patch.dict(os.environ, {'GEMINI_API_KEY': 'mock_api_key'})
-    llm_content = {"insights": [{"insight_id": "i1", "narrative": "Missing title.", "suggested_section": "Summary"}]}
-    setup_llm_mock(mocker, llm_content)
+    mock_llm.set_response(_LLM_INSIGHTS_MISSING_TITLE)
     updated_state = insight_generation_node(mock_graph_state_for_insights)
     assert updated_state['status'] == "error"
     assert "validation error for GeneratedInsightsOutput" in updated_state['error_message']
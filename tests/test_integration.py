@@ -1,7 +1,6 @@
 import pytest
 import os
 import pandas as pd
-from unittest.mock import patch, MagicMock
 from src.graph.state import GraphState
 from src.agents.data_analysis_node import data_analysis_node
 from src.agents.visualization_node import visualization_node
@@ -9,102 +8,72 @@ from src.agents.insight_generation_node import insight_generation_node
 from src.agents.report_drafting_node import report_drafting_node
 from src.agents.safety_node import safety_check_node
 from schemas.messages import DataProfile, GeneratedVisual, AnalysisInsight, ReportSectionsDraft
-import json
+from tests.fixtures_llm import LLM_FIXTURES
 
-# --- Setup for Integration Test ---
-@pytest.fixture(scope="module")
-def setup_test_data(tmpdir_factory):
-    """Creates a temporary test directory and a dummy CSV file."""
-    test_dir = tmpdir_factory.mktemp("test_data")
-    csv_path = test_dir.join("dummy_data.csv")
-    csv_content = """date,sales,category
-2023-01-01,150.50,A
-2023-01-02,200.75,B
-2023-01-03,125.20,A
-2023-01-04,300.10,C
-2023-01-05,175.90,B
-"""
-    csv_path.write(csv_content)
-    return str(csv_path)
+# Deselected by the default addopts in pytest.ini; run with -m integration
+pytestmark = pytest.mark.integration
 
-@pytest.fixture(autouse=True)
-def mock_env_vars():
-    """Mocks the environment variable to prevent API key errors."""
-    with patch.dict(os.environ, {"GEMINI_API_KEY": "dummy_api_key"}):
-        yield
+# --- Setup for Integration Test ---
+# The dummy CSV and the GEMINI_API_KEY come from session-scoped fixtures in conftest.py,
+# and the canned LLM responses (LLM_FIXTURES) from tests/fixtures_llm.py.
 
 @pytest.fixture(scope="module", autouse=True)
-def mock_all_llm_calls():
+def in_memory_csv(module_mocker, setup_test_data):
+    """
+    Parses the session CSV once and serves every pd.read_csv in this module from that frame,
+    so the nodes never parse the file again.
+    """
+    csv_path, _, _ = setup_test_data
+    dummy_df = pd.read_csv(csv_path)
+    module_mocker.patch('src.agents.data_analysis_node.pd.read_csv', side_effect=lambda *args, **kwargs: dummy_df.copy())
+
+
+@pytest.fixture(autouse=True)
+def mock_all_llm_calls(mock_llm):
     """
-    A single fixture to mock all LLM calls and the os.getenv call.
+    Answers every agent's LLM call with its canned response from LLM_FIXTURES.
     This ensures consistency and prevents any real API calls or errors.
     """
-    mock_llm_data_analysis = MagicMock()
-    mock_llm_data_analysis.return_value.invoke.return_value.content = '{"num_rows": 5, "num_columns": 3, "column_details": {}, "key_observations": "Mock observations"}'
-
-    mock_llm_visualization = MagicMock()
-    mock_llm_visualization.return_value.invoke.return_value.content = """```json
-    {
-        "suggestions": [
-            {"type": "line", "columns": ["date", "sales"], "title": "Sales Trend", "description": "Trend over time.", "suggested_section": "Key Findings"}
-        ]
-    }
-    ```"""
-
-    mock_llm_insights = MagicMock()
-    mock_llm_insights.return_value.invoke.return_value.content = json.dumps({"insights": [
-        {"insight_id": "insight_1", "title": "Mock Insight", "narrative": "Mock narrative.",
-         "suggested_section": "Introduction"}]})
-
-    mock_llm_drafting = MagicMock()
-    mock_llm_drafting.return_value.invoke.return_value.content = '{"introduction_text": "Mock intro.", "analysis_narratives": ["Mock narrative 1"], "key_takeaways_bullet_points": ["Mock takeaway 1"], "conclusion_text": "Mock conclusion.", "dataset_title": "Mock Title", "figure_id_map": {"[FIGURE 1]": "chart_1"}, "clarification_questions": []}'
-
-    mock_llm_safety = MagicMock()
-    # Default to a successful safety check for most tests
-    mock_llm_safety.return_value.invoke.return_value.content = json.dumps(
-        {"is_safe": True, "is_accurate": True, "reasoning": "The report is safe and accurate."})
-    with (
-        patch('src.agents.data_analysis_node.os.getenv', return_value="dummy_api_key"),
-        patch('src.agents.data_analysis_node.ChatGoogleGenerativeAI') as mock_llm_data_analysis,
-        patch('src.agents.visualization_node.os.getenv', return_value="dummy_api_key"),
-        patch('src.agents.visualization_node.ChatGoogleGenerativeAI') as mock_llm_visualization,
-        patch('src.agents.insight_generation_node.os.getenv', return_value="dummy_api_key"),
-        patch('src.agents.insight_generation_node.ChatGoogleGenerativeAI') as mock_llm_insights,
-        patch('src.agents.report_drafting_node.os.getenv', return_value="dummy_api_key"),
-        patch('src.agents.report_drafting_node.ChatGoogleGenerativeAI') as mock_llm_drafting,
-        patch('src.agents.safety_node.os.getenv', return_value="dummy_api_key"),
-        patch('src.agents.safety_node.ChatGoogleGenerativeAI') as mock_llm_safety,
-    ):
-        mock_llm_data_analysis.return_value.invoke.return_value.content = '{"num_rows": 5, "num_columns": 3, "column_details": {}, "key_observations": "Mock observations"}'
-        mock_llm_visualization.return_value.invoke.return_value.content = """```json
-{
-    "suggestions": [
-        {"type": "line", "columns": ["date", "sales"], "title": "Sales Trend Over Time", "description": "Shows how sales have changed over the recorded period.", "suggested_section": "Key Findings"},
-        {"type": "bar", "columns": ["category"], "title": "Sales Count by Category", "description": "Displays the distribution of sales across different product categories.", "suggested_section": "Key Findings"}
-    ]
-}
-```"""
-        mock_llm_insights.return_value.invoke.return_value.content = json.dumps({"insights": [{"insight_id": "insight_1", "title": "Mock Insight 1", "narrative": "Mock narrative for insight 1.", "suggested_section": "Introduction"}, {"insight_id": "insight_2", "title": "Mock Insight 2", "narrative": "Mock narrative for insight 2.", "suggested_section": "Key Findings"}]})
-        mock_llm_drafting.return_value.invoke.return_value.content = '{"introduction_text": "Mock intro.", "analysis_narratives": ["Mock narrative 1", "Mock narrative 2"], "key_takeaways_bullet_points": ["Mock takeaway 1", "Mock takeaway 2"], "conclusion_text": "Mock conclusion.", "dataset_title": "Mock Title", "figure_id_map": {"[FIGURE 1]": "chart_1"}, "clarification_questions": []}'
-        mock_llm_safety.return_value.invoke.return_value.content = json.dumps({"is_safe": True, "is_accurate": True, "reasoning": "The report is safe and accurate."})
-
-        yield
+    mock_llm.set_responses(LLM_FIXTURES)
+
+
+@pytest.fixture(scope="module")
+def make_state(setup_test_data):
+    """Returns a builder for the initial GraphState of a run over the session CSV."""
+    csv_path, _, _ = setup_test_data
+    output_dir = os.path.dirname(csv_path)
+
+    def _make(request_id, instructions):
+        return GraphState(
+            request_id=request_id,
+            file_path=csv_path,
+            instructions=instructions,
+            dataset_name="dummy_data",
+            chart_output_dir=output_dir,
+        )
+    return _make
+
+
+@pytest.fixture(scope="module")
+def state_after_insights(make_state, mock_llm):
+    """
+    Runs data analysis, visualization and insight generation once for the module.
+    Tests that continue from here must copy the state, since the nodes update it in place.
+    """
+    initial_state = make_state("integration_test_2", "Analyze sales data, visualize trends, and provide insights.")
+
+    # Module fixtures are set up before the per-test mock_all_llm_calls, so register the responses here
+    mock_llm.set_responses(LLM_FIXTURES)
+    state_after_analysis = data_analysis_node(initial_state)
+    state_after_visualization = visualization_node(state_after_analysis)
+    return insight_generation_node(state_after_visualization)
 
 # --- Integration Test Cases ---
-def test_data_analysis_to_visualization_integration(setup_test_data):
+def test_data_analysis_to_visualization_integration(make_state):
     """
     Tests the seamless integration between the data analysis and visualization nodes.
     """
-    csv_path = setup_test_data
-    output_dir = os.path.dirname(csv_path)
-
-    initial_state = GraphState(
-        request_id="integration_test_1",
-        file_path=csv_path,
-        instructions="Analyze sales data and visualize trends.",
-        dataset_name="dummy_data",
-        chart_output_dir=output_dir,
-    )
+    initial_state = make_state("integration_test_1", "Analyze sales data and visualize trends.")
 
     state_after_analysis = data_analysis_node(initial_state)
     assert state_after_analysis.get('dataframe_profile') is not None
@@ -113,56 +82,27 @@ def test_data_analysis_to_visualization_integration(setup_test_data):
     assert len(state_after_visualization.get('generated_visuals', [])) > 0
 
 
-def test_data_analysis_to_insight_generation_integration(setup_test_data):
+def test_data_analysis_to_insight_generation_integration(state_after_insights):
     """
     Tests the integration from data analysis through visualization to insight generation.
     """
-    csv_path = setup_test_data
-    output_dir = os.path.dirname(csv_path)
-
-    initial_state = GraphState(
-        request_id="integration_test_2",
-        file_path=csv_path,
-        instructions="Analyze sales data, visualize trends, and provide insights.",
-        dataset_name="dummy_data",
-        chart_output_dir=output_dir,
-    )
-
-    state_after_analysis = data_analysis_node(initial_state)
-    state_after_visualization = visualization_node(state_after_analysis)
-    state_after_insights = insight_generation_node(state_after_visualization)
-
     # Assert the status and the output
     assert state_after_insights['status'] == "insights_generated", f"Expected status 'insights_generated', but got '{state_after_insights.get('status')}'"
     assert len(state_after_insights.get('analysis_insights', [])) > 0
     assert isinstance(state_after_insights.get('analysis_insights', [])[0], AnalysisInsight)
 
 
-def test_full_pipeline_integration(setup_test_data):
+def test_full_pipeline_integration(state_after_insights):
     """
     Tests the seamless integration of all four agents in the pipeline.
     """
-    csv_path = setup_test_data
-    output_dir = os.path.dirname(csv_path)
-
-    initial_state = GraphState(
-        request_id="full_integration_test",
-        file_path=csv_path,
-        instructions="Analyze sales data and draft a full report.",
-        dataset_name="dummy_data",
-        chart_output_dir=output_dir,
-    )
-
-    state_after_analysis = data_analysis_node(initial_state)
-    state_after_visualization = visualization_node(state_after_analysis)
-    state_after_insights = insight_generation_node(state_after_visualization)
-
-    state_after_drafting = report_drafting_node(state_after_insights)
+    # The nodes update the state in place, so work on a copy of the shared fixture
+    state_after_drafting = report_drafting_node(dict(state_after_insights))
     state_after_safety_check = safety_check_node(state_after_drafting)
 
     # Assert the status and the output
-    assert state_after_safety_check['status'] == "error"
-    assert "Report validation failed due to an internal error" in state_after_safety_check['error_message']
+    assert state_after_safety_check['status'] == "safety_checked"
+    assert state_after_safety_check.get('error_message') is None
     # assert state_after_drafting['status'] == "report_drafted", f"Expected status 'report_drafted', but got '{state_after_drafting.get('status')}'"
     # assert state_after_drafting.get('report_sections_draft') is not None
     # assert isinstance(state_after_drafting.get('report_sections_draft'), ReportSectionsDraft)
\ No newline at end of file
@@ -1,59 +1,82 @@
 import pytest
 import os
-import re
-from unittest.mock import MagicMock, mock_open, patch
+import io
 from graph.state import GraphState
 from src.agents.report_finalization_node import report_finalization_node
-from schemas.messages import ReportSectionsDraft, GeneratedVisual, ReportFormat
+from schemas.messages import ReportSectionsDraft, ReportFormat
+from tests.fixtures_llm import REPORT_DRAFT, GENERATED_VISUAL
+
+
+class _FakeFS:
+    """
+    In-memory stand-in for open(): every file written through it is kept in `files`,
+    keyed by path, with the text it held when closed.
+    """
+
+    def __init__(self):
+        self.files = {}
+
+    def open(self, path, mode='r', *args, **kwargs):
+        return _MemoryFile(self.files, path)
+
+
+class _MemoryFile(io.StringIO):
+    def __init__(self, files, path):
+        super().__init__()
+        self._files = files
+        self._path = path
+
+    def close(self):
+        if not self.closed:
+            self._files[self._path] = self.getvalue()
+        super().close()
 
 
 # --- Fixtures for mock data ---
 
 @pytest.fixture
-def mock_graph_state_for_finalization():
+def fake_fs(mocker):
+    """Routes the finalization node's open() calls into an in-memory _FakeFS."""
+    fs = _FakeFS()
+    mocker.patch('src.agents.report_finalization_node.open', fs.open, create=True)
+    return fs
+
+
+@pytest.fixture
+def output_dirs(tmp_path):
+    """
+    Per-test report and chart output directories, so the node never writes into the shared
+    local_app_data tree (and parallel xdist workers can't collide).
+    """
+    return {"report_output_dir": str(tmp_path / "reports"), "chart_output_dir": str(tmp_path / "charts")}
+
+
+@pytest.fixture
+def mock_graph_state_for_finalization(output_dirs):
     """
     Provides a mock GraphState with all required inputs for the finalization node.
     """
-    mock_visual = GeneratedVisual(
-        visual_id="chart_1",
-        type="bar_chart",
-        file_path="local_app_data/charts/chart_1.png",
-        description="Bar chart showing sales by region.",
-        code="mock_code_1",
-        suggested_section="Key Findings"
-    )
-    mock_draft = ReportSectionsDraft(
-        introduction_text="This is a mock introduction.",
-        analysis_narratives=["Regional Sales Performance:- The key finding is here, as shown in [FIGURE 1]."],
-        key_takeaways_bullet_points=["Key takeaway 1", "Key takeaway 2"],
-        conclusion_text="This is a mock conclusion.",
-        dataset_title="Mock Data Analysis",
-        figure_id_map={"[FIGURE 1]": "chart_1"},
-        clarification_questions=[]
-    )
     return GraphState(
         request_id="finalization_test_1",
         instructions="Finalize the report.",
-        report_sections_draft=mock_draft,
-        generated_visuals=[mock_visual],
+        report_sections_draft=REPORT_DRAFT,
+        generated_visuals=[GENERATED_VISUAL],
         status="report_drafted",
-        dataset_name="Mock Data"
+        dataset_name="Mock Data",
+        **output_dirs
     )
 
 
 # --- Test Cases ---
 
-def test_report_finalization_node_success(mock_graph_state_for_finalization, mocker):
+def test_report_finalization_node_success(mock_graph_state_for_finalization, mocker, fake_fs):
     """Tests the successful finalization of a report into Markdown and PDF."""
 
-    # Mock file I/O to prevent actual file creation
-    mock_open_func = mock_open()
-    mocker.patch('builtins.open', mock_open_func)
-    mocker.patch('os.path.exists', return_value=True)
-    mocker.patch('os.path.abspath', return_value="/mock/path/chart_1.png")
+    mocker.patch('src.agents.report_finalization_node._exists', return_value=True)
+    mocker.patch('src.agents.report_finalization_node._abspath', return_value="/mock/path/chart_1.png")
 
     # Mock weasyprint to prevent PDF generation
-    mocker.patch('src.agents.report_finalization_node.HTML')
+    mocker.patch('src.agents.report_finalization_node._get_html')
 
     updated_state = report_finalization_node(mock_graph_state_for_finalization)
 
@@ -70,31 +93,32 @@ def test_report_finalization_node_success(mock_graph_state_for_finalization, moc
     assert "- Key takeaway 1" in final_content
     assert "This is a mock conclusion." in final_content
 
-    # Assertions for file creation calls
-    mock_open_func.assert_called_once()
-    assert mock_open_func.call_args[0][0].endswith(".md")
+    # Assertions for the written Markdown file
+    assert len(fake_fs.files) == 1
+    (md_path, md_content), = fake_fs.files.items()
+    assert md_path.endswith(".md")
+    assert md_content == final_content
 
     # Assert PDF generation was attempted
     assert updated_state['final_report'].pdf_file_path is not None
     assert updated_state['final_report'].pdf_file_path.endswith(".pdf")
 
 
-def test_report_finalization_node_missing_draft(mocker):
+def test_report_finalization_node_missing_draft(mocker, output_dirs):
     """Tests the node's behavior when the report sections draft is missing."""
-    empty_state = GraphState(request_id="finalization_test_2", status="report_drafted")
+    empty_state = GraphState(request_id="finalization_test_2", status="report_drafted", **output_dirs)
     updated_state = report_finalization_node(empty_state)
     assert updated_state['status'] == "error"
     assert "Cannot finalize report: Report sections draft is missing." in updated_state['error_message']
 
 
-def test_report_finalization_node_missing_visual_file(mock_graph_state_for_finalization, mocker):
+def test_report_finalization_node_missing_visual_file(mock_graph_state_for_finalization, mocker, fake_fs):
     """
     Tests handling of a scenario where a visual is referenced but the image file does not exist.
     """
-    mocker.patch('os.path.exists', return_value=False)
-    mocker.patch('builtins.open', mock_open())
-    mocker.patch('os.path.abspath', return_value="/mock/path/chart_1.png")
-    mocker.patch('src.agents.report_finalization_node.HTML')
+    mocker.patch('src.agents.report_finalization_node._exists', return_value=False)
+    mocker.patch('src.agents.report_finalization_node._abspath', return_value="/mock/path/chart_1.png")
+    mocker.patch('src.agents.report_finalization_node._get_html')
 
     updated_state = report_finalization_node(mock_graph_state_for_finalization)
 
@@ -103,16 +127,16 @@ def test_report_finalization_node_missing_visual_file(mock_graph_state_for_final
     assert "![Bar chart" not in updated_state['final_report'].content
 
 
-def test_report_finalization_node_missing_figure_map_entry(mock_graph_state_for_finalization, mocker):
+def test_report_finalization_node_missing_figure_map_entry(mock_graph_state_for_finalization, mocker, fake_fs):
     """
     Tests handling of a scenario where a visual placeholder exists but has no
     corresponding entry in the figure_id_map.
     """
-    # Remove the figure map entry for the mock draft
-    mock_graph_state_for_finalization['report_sections_draft'].figure_id_map = {}
-    mocker.patch('os.path.exists', return_value=True)
-    mocker.patch('builtins.open', mock_open())
-    mocker.patch('src.agents.report_finalization_node.HTML')
+    # Remove the figure map entry, on a copy so the module-scoped draft stays intact
+    draft = mock_graph_state_for_finalization['report_sections_draft']
+    mock_graph_state_for_finalization['report_sections_draft'] = draft.model_copy(update={"figure_id_map": {}})
+    mocker.patch('src.agents.report_finalization_node._exists', return_value=True)
+    mocker.patch('src.agents.report_finalization_node._get_html')
 
     updated_state = report_finalization_node(mock_graph_state_for_finalization)
 
@@ -120,16 +144,15 @@ def test_report_finalization_node_missing_figure_map_entry(mock_graph_state_for_
     assert "*(Visual for [FIGURE 1] not mapped)*" in updated_state['final_report'].content
 
 
-def test_report_finalization_node_pdf_generation_failure(mock_graph_state_for_finalization, mocker):
+def test_report_finalization_node_pdf_generation_failure(mock_graph_state_for_finalization, mocker, fake_fs):
     """
     Tests that the node handles a failure during PDF generation gracefully,
     still completing the Markdown part.
     """
-    mocker.patch('os.path.exists', return_value=True)
-    mocker.patch('builtins.open', mock_open())
+    mocker.patch('src.agents.report_finalization_node._exists', return_value=True)
 
     # Mock weasyprint's write_pdf to raise an exception
-    mocker.patch('src.agents.report_finalization_node.HTML').return_value.write_pdf.side_effect = Exception(
+    mocker.patch('src.agents.report_finalization_node._get_html').return_value.return_value.write_pdf.side_effect = Exception(
         "PDF generation failed")
 
     updated_state = report_finalization_node(mock_graph_state_for_finalization)
@@ -139,7 +162,7 @@ def test_report_finalization_node_pdf_generation_failure(mock_graph_state_for_fi
     assert "Error generating PDF: PDF generation failed" in updated_state['error_message']
 
 
-def test_report_finalization_node_empty_inputs(mocker):
+def test_report_finalization_node_empty_inputs(mocker, output_dirs, fake_fs):
     """Tests that the node can produce a valid, albeit minimal, report with empty inputs."""
     empty_draft = ReportSectionsDraft(
         introduction_text="",
@@ -154,12 +177,12 @@ def test_report_finalization_node_empty_inputs(mocker):
         request_id="finalization_test_4",
         report_sections_draft=empty_draft,
         generated_visuals=[],
-        status="report_drafted"
+        status="report_drafted",
+        **output_dirs
     )
 
-    mocker.patch('os.path.exists', return_value=False)
-    mocker.patch('builtins.open', mock_open())
-    mocker.patch('src.agents.report_finalization_node.HTML')
+    mocker.patch('src.agents.report_finalization_node._exists', return_value=False)
+    mocker.patch('src.agents.report_finalization_node._get_html')
 
     updated_state = report_finalization_node(empty_state)
 
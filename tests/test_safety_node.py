@@ -1,177 +1,231 @@
 import pytest
-import os
 import json
-from unittest.mock import patch, MagicMock
+from unittest.mock import MagicMock
 from requests.exceptions import RequestException
 from pydantic import ValidationError
 from langchain_core.messages import AIMessage
 
-from src.agents.safety_node import safety_check_node, SafetyCheckResult
-from schemas.messages import ReportSectionsDraft, DataProfile
+from src.agents.safety_node import safety_check_node, clear_safety_cache, SafetyCheckResult
 from graph.state import GraphState
 
-# Mock environment variables to ensure the LLM initialization doesn't fail
-@pytest.fixture(autouse=True)
-def mock_env_vars():
-    with patch.dict(os.environ, {"GEMINI_API_KEY": "mock_api_key"}):
-        yield
+# Canned LLM responses, built once at import
+_SAFE_OK = AIMessage(content=json.dumps({
+    "is_safe": True,
+    "is_accurate": True,
+    "reasoning": "The report is safe and accurate."
+}))
+_UNSAFE = AIMessage(content=json.dumps({
+    "is_safe": False,
+    "is_accurate": True,
+    "reasoning": "The report contains harmful language."
+}))
+_INACCURATE = AIMessage(content=json.dumps({
+    "is_safe": True,
+    "is_accurate": False,
+    "reasoning": "The report's conclusion is not supported by the data."
+}))
+_BAD_JSON = AIMessage(content='is_safe: true, is_accurate: true, reasoning: The JSON is invalid')
+_TRUNCATED_JSON = AIMessage(content='{"is_safe": true, "is_accurate": true, "reasoning": "The JSON is invalid"')
+_FENCED_SAFE_OK = AIMessage(content=f"```json\n{_SAFE_OK.content}\n```")
+_BARE_FENCED_SAFE_OK = AIMessage(content=f"```\n{_SAFE_OK.content}\n```")
+_PREAMBLE_SAFE_OK = AIMessage(content=f"Here is my assessment of the report:\n{_SAFE_OK.content}")
+_PREAMBLE_FENCED_SAFE_OK = AIMessage(content=f"Here is my assessment of the report:\n```json\n{_SAFE_OK.content}\n```")
+
+# The dummy GEMINI_API_KEY comes from the session-scoped fixture in conftest.py
 
 @pytest.fixture
-def initial_state():
+def initial_state(sample_report_draft, sample_data_profile):
     """
     Fixture to create a valid initial state for testing the safety node.
+    The state is fresh for each test, since the node updates it in place.
     """
-    mock_report_draft = ReportSectionsDraft(
-        introduction_text="This is a safe and accurate report.",
-        analysis_narratives=["Finding 1:- The data shows a clear trend."],
-        key_takeaways_bullet_points=["Key takeaway one."],
-        conclusion_text="In conclusion, the data is great.",
-        dataset_title="Mock Dataset",
-        figure_id_map={"[FIGURE 1]": "visual_1"},
-        clarification_questions=[]
-    )
-    mock_dataframe_profile = DataProfile(
-        num_rows=100,
-        num_columns=5,
-        column_details={},
-        key_observations="No issues found."
-    )
     return GraphState(
         request_id="test_safety",
         file_path="/mock/path/data.csv",
         instructions="Create a report on the mock data.",
-        report_sections_draft=mock_report_draft,
-        dataframe_profile=mock_dataframe_profile,
+        report_sections_draft=sample_report_draft,
+        dataframe_profile=sample_data_profile,
         status="report_drafted",
         error_message=None
     )
 
-@pytest.fixture
-def mock_llm_with_response():
+@pytest.fixture(autouse=True)
+def _clear_safety_cache():
+    """Ensures a cached verdict from one test doesn't stand in for the LLM response of another."""
+    clear_safety_cache()
+    yield
+    clear_safety_cache()
+
+
+@pytest.fixture(autouse=True)
+def _no_sleep(mocker):
+    """Skips the exponential backoff between retries, so the retry tests don't wait on the clock."""
+    return mocker.patch('src.agents.safety_node.time.sleep')
+
+
+@pytest.fixture(autouse=True)
+def mock_llm_with_response(mocker):
     """
-    A reusable fixture to mock the LLM's ChatGoogleGenerativeAI class.
-    This allows us to configure the return value of the LLM's invoke() method
-    for each test case, reducing code duplication.
+    Mocks the LLM's ChatGoogleGenerativeAI class for every test in this module.
+    Tests configure the return value or side effect of the LLM's invoke() method
+    on the instance this fixture returns.
     """
-    with patch('src.agents.safety_node.ChatGoogleGenerativeAI') as mock_llm_class:
-        mock_llm_instance = MagicMock()
-        mock_llm_class.return_value = mock_llm_instance
-        yield mock_llm_instance
+    mock_llm_instance = MagicMock()
+    mocker.patch('src.agents.safety_node.ChatGoogleGenerativeAI', return_value=mock_llm_instance)
+    return mock_llm_instance
 
 # --- Test Cases for safety_check_node ---
 
-@patch('src.agents.safety_node.ChatGoogleGenerativeAI')
-def test_safety_check_node_success(mock_llm, initial_state):
+@pytest.mark.parametrize("llm_response, expected_status, expected_error", [
+    pytest.param(_SAFE_OK, "safety_checked", None, id="success"),
+    pytest.param(_UNSAFE, "error", "Safety check failed", id="failed_safety"),
+    pytest.param(_INACCURATE, "error", "Accuracy check failed", id="failed_accuracy"),
+])
+def test_safety_check_node_llm_verdict(mock_llm_with_response, initial_state, llm_response, expected_status,
+                                       expected_error):
     """
-    Tests the scenario where the LLM returns a successful safety check.
+    Tests the node's outcome for each LLM verdict: a passed check, a failed safety check
+    and a failed accuracy check.
     """
-    mock_llm_instance = MagicMock()
-    # Correctly mock the LLM to return a langchain AIMessage object
-    mock_llm_instance.invoke.return_value = AIMessage(content=json.dumps({
-        "is_safe": True,
-        "is_accurate": True,
-        "reasoning": "The report is safe and accurate."
-    }))
-    mock_llm.return_value = mock_llm_instance
+    mock_llm_with_response.invoke.return_value = llm_response
 
     result_state = safety_check_node(initial_state)
 
-    assert result_state['status'] == "safety_checked"
-    assert result_state['error_message'] is None
-    mock_llm_instance.invoke.assert_called_once()
+    assert result_state['status'] == expected_status
+    if expected_error is None:
+        assert result_state['error_message'] is None
+    else:
+        assert expected_error in result_state['error_message']
+    mock_llm_with_response.invoke.assert_called_once()
 
 
-@patch('src.agents.safety_node.ChatGoogleGenerativeAI')
-def test_safety_check_node_failed_safety(mock_llm, initial_state):
-    """
-    Tests the scenario where the LLM fails the safety check.
-    """
-    mock_llm_instance = MagicMock()
-    # Correctly mock the LLM to return a langchain AIMessage object
-    mock_llm_instance.invoke.return_value = AIMessage(content=json.dumps({
-        "is_safe": False,
-        "is_accurate": True,
-        "reasoning": "The report contains harmful language."
-    }))
-    mock_llm.return_value = mock_llm_instance
+def test_safety_check_node_invalid_json(mock_llm_with_response, initial_state):
+    """Tests the scenario where the LLM returns invalid JSON, leading to a parsing error."""
+    mock_llm_with_response.invoke.return_value = _BAD_JSON
 
     result_state = safety_check_node(initial_state)
 
-    assert result_state['status'] == "error"
-    assert "Safety check failed" in result_state['error_message']
-    mock_llm_instance.invoke.assert_called_once()
+    assert result_state.get('status') == "error"
+    assert "Report validation failed due to an internal error" in result_state.get('error_message')
 
 
-@patch('src.agents.safety_node.ChatGoogleGenerativeAI')
-def test_safety_check_node_failed_accuracy(mock_llm, initial_state):
-    """
-    Tests the scenario where the LLM fails the accuracy check.
-    """
-    mock_llm_instance = MagicMock()
-    # Correctly mock the LLM to return a langchain AIMessage object
-    mock_llm_instance.invoke.return_value = AIMessage(content=json.dumps({
-        "is_safe": True,
-        "is_accurate": False,
-        "reasoning": "The report's conclusion is not supported by the data."
-    }))
-    mock_llm.return_value = mock_llm_instance
+def test_safety_check_node_truncated_json(mock_llm_with_response, initial_state):
+    """Tests that a truncated JSON response is rejected rather than repaired into a verdict."""
+    mock_llm_with_response.invoke.return_value = _TRUNCATED_JSON
 
     result_state = safety_check_node(initial_state)
 
-    assert result_state['status'] == "error"
-    assert "Accuracy check failed" in result_state['error_message']
-    mock_llm_instance.invoke.assert_called_once()
+    assert result_state.get('status') == "error"
+    assert "Report validation failed due to an internal error" in result_state.get('error_message')
 
 
-def test_safety_check_node_invalid_json(mock_llm_with_response, initial_state):
-    """Tests the scenario where the LLM returns invalid JSON, leading to a parsing error."""
-    mock_response_content = '{"is_safe": true, "is_accurate": true, "reasoning": "The JSON is invalid"'
-    mock_llm_with_response.invoke.return_value = MagicMock(content=mock_response_content)
+@pytest.mark.parametrize("llm_response", [
+    pytest.param(_FENCED_SAFE_OK, id="json_fence"),
+    pytest.param(_BARE_FENCED_SAFE_OK, id="bare_fence"),
+    pytest.param(_PREAMBLE_SAFE_OK, id="preamble"),
+    pytest.param(_PREAMBLE_FENCED_SAFE_OK, id="preamble_and_fence"),
+])
+def test_safety_check_node_fenced_json(mock_llm_with_response, initial_state, llm_response):
+    """
+    Tests that a verdict wrapped in a ``` or ```json fence, or preceded by a line of prose,
+    as Gemini often returns it, still parses.
+    """
+    mock_llm_with_response.invoke.return_value = llm_response
 
     result_state = safety_check_node(initial_state)
 
-    assert result_state.get('status') == "error"
-    assert "Report validation failed due to an internal error" in result_state.get('error_message')
+    assert result_state['status'] == "safety_checked"
+    assert result_state['error_message'] is None
 
 
-@patch('src.agents.safety_node.ChatGoogleGenerativeAI')
-def test_safety_check_node_retry_then_success(mock_llm, initial_state):
+def test_safety_check_node_retry_then_success(mock_llm_with_response, initial_state, _no_sleep):
     """
     Tests that the node retries on a network error and succeeds on a subsequent attempt.
     """
-    mock_llm_instance = MagicMock()
     # First two calls raise an exception, third call returns success
-    mock_llm_instance.invoke.side_effect = [
+    mock_llm_with_response.invoke.side_effect = [
         RequestException("Mock network error"),
         RequestException("Another mock network error"),
-        AIMessage(content=json.dumps({"is_safe": True, "is_accurate": True, "reasoning": "All good."}))
+        _SAFE_OK
     ]
-    mock_llm.return_value = mock_llm_instance
 
     result_state = safety_check_node(initial_state)
 
     assert result_state['status'] == "safety_checked"
     assert result_state['error_message'] is None
     # Ensure three calls were made
-    assert mock_llm_instance.invoke.call_count == 3
+    assert mock_llm_with_response.invoke.call_count == 3
+    # The backoff still doubles between attempts
+    assert [c.args[0] for c in _no_sleep.call_args_list] == [2, 4]
 
 
-@patch('src.agents.safety_node.ChatGoogleGenerativeAI')
-def test_safety_check_node_max_retries_fail(mock_llm, initial_state):
+def test_safety_check_node_max_retries_fail(mock_llm_with_response, initial_state):
     """
     Tests that the node fails after reaching the max number of retries for a network error.
     """
-    mock_llm_instance = MagicMock()
     # All three calls raise an exception
-    mock_llm_instance.invoke.side_effect = RequestException("Persistent mock network error")
-    mock_llm.return_value = mock_llm_instance
+    mock_llm_with_response.invoke.side_effect = RequestException("Persistent mock network error")
 
     result_state = safety_check_node(initial_state)
 
     assert result_state['status'] == "error"
     assert "Failed to get a response from the LLM after 3 attempts" in result_state['error_message']
     # Ensure three calls were made
-    assert mock_llm_instance.invoke.call_count == 3
+    assert mock_llm_with_response.invoke.call_count == 3
+
+
+def test_safety_check_node_cache_hit(mock_llm_with_response, initial_state, sample_report_draft,
+                                     sample_data_profile):
+    """
+    Tests that re-checking an unchanged draft against the same profile and instructions
+    reuses the cached verdict instead of invoking the LLM again.
+    """
+    mock_llm_with_response.invoke.return_value = _SAFE_OK
+
+    first_state = safety_check_node(initial_state)
+    second_state = safety_check_node(GraphState(
+        request_id="test_safety_repeat",
+        file_path="/mock/path/data.csv",
+        instructions=initial_state['instructions'],
+        report_sections_draft=sample_report_draft,
+        dataframe_profile=sample_data_profile,
+        status="report_drafted",
+        error_message=None
+    ))
+
+    assert first_state['status'] == "safety_checked"
+    assert second_state['status'] == "safety_checked"
+    assert second_state['error_message'] is None
+    assert mock_llm_with_response.invoke.call_count == 1
+
+
+@pytest.mark.parametrize("failing_verdict", [
+    pytest.param(_UNSAFE, id="failed_safety"),
+    pytest.param(_INACCURATE, id="failed_accuracy"),
+])
+def test_safety_check_node_failing_verdict_not_cached(mock_llm_with_response, initial_state, sample_report_draft,
+                                                      sample_data_profile, failing_verdict):
+    """
+    Tests that a failing verdict is not cached: checking the same draft again invokes the LLM,
+    so a flaky failure can pass on the next attempt.
+    """
+    mock_llm_with_response.invoke.side_effect = [failing_verdict, _SAFE_OK]
+
+    first_state = safety_check_node(initial_state)
+    second_state = safety_check_node(GraphState(
+        request_id="test_safety_repeat",
+        file_path="/mock/path/data.csv",
+        instructions=initial_state['instructions'],
+        report_sections_draft=sample_report_draft,
+        dataframe_profile=sample_data_profile,
+        status="report_drafted",
+        error_message=None
+    ))
+
+    assert first_state['status'] == "error"
+    assert second_state['status'] == "safety_checked"
+    assert second_state['error_message'] is None
+    assert mock_llm_with_response.invoke.call_count == 2
 
 
 def test_safety_check_node_missing_input(initial_state):
@@ -2,18 +2,20 @@ import pytest
 import os
 import pandas as pd
 import json
-from unittest.mock import MagicMock
-from langchain_core.messages import AIMessage
+import matplotlib
 from graph.state import GraphState
-from src.agents.visualization_node import visualization_node, generate_chart, CHART_OUTPUT_DIR
+from src.agents.visualization_node import visualization_node, generate_chart
 from schemas.messages import DataProfile, VisualGenerationInstruction, GeneratedVisual
 from pydantic import ValidationError
 
+# Render charts off-screen, without needing a display or GUI toolkit
+matplotlib.use("Agg")
+
 
 # Fixtures for mock data and setup
-@pytest.fixture
+@pytest.fixture(scope="module")
 def mock_dataframe():
-    """Provides a mock DataFrame for testing."""
+    """Provides a mock DataFrame for testing. Built once per module; the code under test only reads it."""
     data = {
         'sales': [100, 150, 200, 120, 180],
         'region': ['North', 'South', 'North', 'East', 'West'],
@@ -23,10 +25,10 @@ def mock_dataframe():
     return pd.DataFrame(data)
 
 
-@pytest.fixture
-def mock_graph_state_for_visuals():
-    """Provides a mock GraphState with necessary inputs."""
-    mock_data_profile = DataProfile(
+@pytest.fixture(scope="module")
+def mock_data_profile():
+    """The validated DataProfile for the visualization tests, built once per module."""
+    return DataProfile(
         num_rows=5,
         num_columns=4,
         column_details={
@@ -36,6 +38,11 @@ def mock_graph_state_for_visuals():
         },
         key_observations="Sales data shows regional variations."
     )
+
+
+@pytest.fixture
+def mock_graph_state_for_visuals(mock_data_profile):
+    """Provides a mock GraphState with necessary inputs, fresh for each test since the node updates it."""
     return GraphState(
         request_id="visual_test_1",
         file_path="mock_file_path.csv",
@@ -45,43 +52,49 @@ def mock_graph_state_for_visuals():
     )
 
 
-@pytest.fixture
-def temp_chart_path():
-    """Provides a temporary file path for chart saving and cleans up afterward."""
-    path = os.path.join(CHART_OUTPUT_DIR, "test_chart.png")
-    yield path
-    if os.path.exists(path):
-        os.remove(path)
+@pytest.fixture(scope="module")
+def rendered_bar_chart(mock_dataframe, tmp_path_factory, module_mocker, _stub_savefig):
+    """
+    Renders a real bar chart once per module, with the real plt.savefig, and returns (chart_path, chart_code).
+    Tests that only inspect the rendered output share it instead of drawing the chart again.
+    """
+    import matplotlib.pyplot as plt
+    module_mocker.patch.object(plt, 'savefig', _stub_savefig)
+    instruction = VisualGenerationInstruction(
+        type="bar",
+        columns=["region", "sales"],
+        title="Sales by Region",
+        description="Bar chart showing sales for each region.",
+        suggested_section="Analysis"
+    )
+    chart_path = str(tmp_path_factory.mktemp("charts") / "test_chart.png")
+    yield chart_path, generate_chart(mock_dataframe, instruction, chart_path)
+    plt.close('all')
 
 
-# Helper function to mock the LLM response
-def setup_llm_mock(mocker, content):
-    """Mocks the LLM to return a response with the given content."""
-    wrapped_content = f"```json\n{json.dumps(content)}\n```"
-    mock_llm_response = AIMessage(content=wrapped_content)
-    mock_llm_class = mocker.patch('src.agents.visualization_node.ChatGoogleGenerativeAI', autospec=True)
-    mock_llm_instance = mock_llm_class.return_value
-    mock_llm_instance.invoke.return_value = mock_llm_response
+# Canned LLM response contents for MockLLM, wrapped in a ```json fence once at import
+_SUCCESS_LLM = "```json\n" + json.dumps({"suggestions": [
+    {"type": "bar", "columns": ["region", "sales"], "title": "Sales by Region",
+     "description": "Bar chart of sales by region", "suggested_section": "Sales Analysis"},
+    {"type": "line", "columns": ["date", "sales"], "title": "Sales Over Time",
+     "description": "Line chart of sales over time", "suggested_section": "Sales Analysis"}
+]}) + "\n```"
+# Valid JSON but missing a required field (e.g., 'type')
+_INVALID_SCHEMA_LLM = "```json\n" + json.dumps(
+    {"suggestions": [{"columns": ["region", "sales"], "title": "Sales by Region"}]}) + "\n```"
+_INVALID_JSON_LLM = "this is not valid json"
 
 
 # --- Test Cases for visualization_node ---
 
-def test_visualization_node_success(mock_graph_state_for_visuals, mock_dataframe, mocker):
+def test_visualization_node_success(mock_graph_state_for_visuals, mock_dataframe, mocker, mock_llm):
     """
     Tests the successful execution of visualization_node.
-    Mocks LLM to return valid suggestions and mocks pandas to return a valid DataFrame.
+    Mocks LLM to return valid suggestions and puts a valid DataFrame in the state.
     """
-    mock_suggestions_list = [
-        {"type": "bar", "columns": ["region", "sales"], "title": "Sales by Region",
-         "description": "Bar chart of sales by region", "suggested_section": "Sales Analysis"},
-        {"type": "line", "columns": ["date", "sales"], "title": "Sales Over Time",
-         "description": "Line chart of sales over time", "suggested_section": "Sales Analysis"}
-    ]
-    llm_content = {"suggestions": mock_suggestions_list}
-    setup_llm_mock(mocker, llm_content)
-    mocker.patch('pandas.read_csv', return_value=mock_dataframe)
+    mock_llm.set_response(_SUCCESS_LLM)
+    mock_graph_state_for_visuals['dataframe'] = mock_dataframe
     mocker.patch('src.agents.visualization_node.generate_chart', return_value="mock_chart_code_string")
-    mocker.patch.dict(os.environ, {'GEMINI_API_KEY': 'mock_api_key'})
 
     updated_state = visualization_node(mock_graph_state_for_visuals)
 
@@ -91,12 +104,13 @@ def test_visualization_node_success(mock_graph_state_for_visuals, mock_dataframe
     assert isinstance(updated_state['generated_visuals'][0], GeneratedVisual)
     assert updated_state['generated_visuals'][0].visual_id == "chart_visual_test_1_1"
     assert updated_state['generated_visuals'][1].type == "line"
+    # All suggestions come back from a single LLM call, however many charts are generated
+    assert len(mock_llm.calls) == 1
 
 
-def test_visualization_node_missing_api_key(mock_graph_state_for_visuals, mocker):
+def test_visualization_node_missing_api_key(mock_graph_state_for_visuals, monkeypatch):
     """Tests the function's behavior when the GEMINI_API_KEY is not set."""
-    mocker.patch.dict(os.environ, clear=True)
-    mocker.patch('os.getenv', return_value=None)
+    monkeypatch.delenv('GEMINI_API_KEY', raising=False)
 
     updated_state = visualization_node(mock_graph_state_for_visuals)
 
@@ -104,15 +118,12 @@ def test_visualization_node_missing_api_key(mock_graph_state_for_visuals, mocker
     assert "API key for Gemini not found" in updated_state['error_message']
 
 
-def test_visualization_node_llm_invalid_json(mock_graph_state_for_visuals, mock_dataframe, mocker):
+def test_visualization_node_llm_invalid_json(mock_graph_state_for_visuals, mock_dataframe, mock_llm):
     """Tests error handling for invalid JSON from the LLM."""
-    mocker.patch.dict(os.environ, {'GEMINI_API_KEY': 'mock_api_key'})
-    mocker.patch('pandas.read_csv', return_value=mock_dataframe)
+    mock_graph_state_for_visuals['dataframe'] = mock_dataframe
 
     # Mock LLM to return a non-JSON string
-    mock_llm_class = mocker.patch('src.agents.visualization_node.ChatGoogleGenerativeAI', autospec=True)
-    mock_llm_instance = mock_llm_class.return_value
-    mock_llm_instance.invoke.return_value = AIMessage(content="this is not valid json")
+    mock_llm.set_response(_INVALID_JSON_LLM)
 
     updated_state = visualization_node(mock_graph_state_for_visuals)
 
@@ -135,24 +146,21 @@ def test_visualization_node_llm_invalid_json(mock_graph_state_for_visuals, mock_
 #     assert "ValidationError" in updated_state['error_message']
 
 
-def test_visualization_node_llm_invalid_schema(mock_graph_state_for_visuals, mock_dataframe, mocker):
+def test_visualization_node_llm_invalid_schema(mock_graph_state_for_visuals, mock_dataframe, mock_llm):
     """Tests operational resilience when LLM returns JSON with a schema that doesn't match the Pydantic model."""
-    mocker.patch.dict(os.environ, {'GEMINI_API_KEY': 'mock_api_key'})
-    mocker.patch('pandas.read_csv', return_value=mock_dataframe)
+    mock_graph_state_for_visuals['dataframe'] = mock_dataframe
 
     # Mock LLM to return valid JSON but missing a required field (e.g., 'type')
-    llm_content = {"suggestions": [{"columns": ["region", "sales"], "title": "Sales by Region"}]}
-    setup_llm_mock(mocker, llm_content)
+    mock_llm.set_response(_INVALID_SCHEMA_LLM)
 
     updated_state = visualization_node(mock_graph_state_for_visuals)
 
     assert updated_state['status'] == "error"
     assert "2 validation errors for SuggestedVisualizations" in updated_state['error_message']
 
-def test_visualization_node_empty_dataframe(mock_graph_state_for_visuals, mocker):
+def test_visualization_node_empty_dataframe(mock_graph_state_for_visuals):
     """Tests the node's behavior when the loaded DataFrame is empty."""
-    mocker.patch.dict(os.environ, {'GEMINI_API_KEY': 'mock_api_key'})
-    mocker.patch('pandas.read_csv', return_value=pd.DataFrame())
+    mock_graph_state_for_visuals['dataframe'] = pd.DataFrame()
 
     updated_state = visualization_node(mock_graph_state_for_visuals)
 
@@ -162,51 +170,31 @@ def test_visualization_node_empty_dataframe(mock_graph_state_for_visuals, mocker
 
 # --- Test Cases for generate_chart helper function ---
 
-def test_generate_chart_success(mock_dataframe, temp_chart_path):
+def test_generate_chart_success(rendered_bar_chart):
     """Tests the successful generation of a chart for a valid instruction."""
-    instruction = VisualGenerationInstruction(
-        type="bar",
-        columns=["region", "sales"],
-        title="Sales by Region",
-        description="Bar chart showing sales for each region.",
-        suggested_section="Analysis"
-    )
-
-    chart_code = generate_chart(mock_dataframe, instruction, temp_chart_path)
+    chart_path, chart_code = rendered_bar_chart
 
     assert chart_code is not None
     assert "sns.barplot" in chart_code
-    assert os.path.exists(temp_chart_path)
-    assert os.path.getsize(temp_chart_path) > 0
-
-
-def test_generate_chart_invalid_columns(mock_dataframe, temp_chart_path):
-    """Tests that the function returns None for invalid column names."""
-    instruction = VisualGenerationInstruction(
-        type="bar",
-        columns=["non_existent_column", "sales"],
-        title="Sales by Region",
-        description="Invalid columns test.",
-        suggested_section="Analysis"
-    )
-
-    chart_code = generate_chart(mock_dataframe, instruction, temp_chart_path)
-
-    assert chart_code is None
-    assert not os.path.exists(temp_chart_path)
+    assert os.path.exists(chart_path)
+    assert os.path.getsize(chart_path) > 0
 
 
-def test_generate_chart_invalid_column_type(mock_dataframe, temp_chart_path):
-    """Tests that the function returns None for inappropriate column types."""
+@pytest.mark.parametrize("chart_type, columns", [
+    pytest.param("bar", ["non_existent_column", "sales"], id="invalid_columns"),
+    pytest.param("histogram", ["region"], id="invalid_column_type"),  # Histogram requires a numeric column
+])
+def test_generate_chart_invalid_instruction(mock_dataframe, tmp_path, chart_type, columns):
+    """Tests that the function returns None, and writes no chart, for invalid columns or column types."""
     instruction = VisualGenerationInstruction(
-        type="histogram",
-        columns=["region"],  # Histogram requires a numeric column
-        title="Region Histogram",
-        description="Invalid column type test.",
+        type=chart_type,
+        columns=columns,
+        title="Invalid Chart",
+        description="Invalid instruction test.",
         suggested_section="Analysis"
     )
 
-    chart_code = generate_chart(mock_dataframe, instruction, temp_chart_path)
+    chart_code = generate_chart(mock_dataframe, instruction, str(tmp_path / "test_chart.png"))
 
     assert chart_code is None
-    assert not os.path.exists(temp_chart_path)
\ No newline at end of file
+    assert not any(tmp_path.iterdir())